@@ -11,18 +11,166 @@ Instructions to run:
 $python3 -m venv venv
 $source venv/bin/activate
 $pip install requests
+$pip install orjson  # optional, speeds up JSON encoding and parsing
+$pip install pyarrow  # optional, needed for --format parquet
 $python3 partnership_ads_booster.py --mode fetch --access-token YOUR_TOKEN --ig-account-id YOUR_IG_ID --creator-username CREATOR_USERNAME
 $python3 partnership_ads_booster.py --mode create --access-token YOUR_TOKEN --input-csv input.csv --ig-account-id YOUR_IG_ID --ad-account-id YOUR_AD_ID --facebook-page-id YOUR_PAGE_ID
 """
 
 import argparse
 import csv
+import functools
+import io
+import itertools
 import json
-import re
+import os
+import string
 import sys
-from typing import Dict, List, Optional, Tuple
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from urllib.parse import urlencode
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    # Parses bytes directly, without decoding them to str first
+    _loads = orjson.loads
+
+except ImportError:  # orjson is optional; fall back to the standard library
+
+    def _dumps(obj) -> str:
+        # Compact separators and raw (unescaped) non-ASCII match orjson's output
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    _loads = json.loads
+
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; only needed for Parquet output
+    pa = pq = None
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Graph API base URLs; ad creatives are created on a newer API version
+GRAPH_API_URL = "https://graph.facebook.com/v22.0/"
+GRAPH_API_CREATIVES_URL = "https://graph.facebook.com/v23.0/"
+
+# Maximum number of concurrent requests when fetching engagement metrics
+METRICS_MAX_WORKERS = 10
+
+# Maximum number of input rows processed concurrently when creating ads. Kept
+# modest to stay within the Graph API rate limits for the ad account.
+CREATE_MAX_WORKERS = 8
+
+# Number of keep-alive connections the shared session keeps per host, and so
+# the most workers that can run without connections being discarded
+HTTP_POOL_SIZE = 20
+
+# Maximum number of media IDs the Graph API accepts in a single ?ids= request
+MEDIA_BATCH_SIZE = 50
+
+# Maximum number of sub-requests the Graph API accepts in one batch request
+GRAPH_BATCH_SIZE = 50
+
+# Number of rows written between flushes of a streamed output CSV
+CSV_FLUSH_EVERY = 1000
+
+# Write buffer for output CSVs, large enough that per-row writes rarely hit the disk
+CSV_WRITE_BUFFER_SIZE = 1 << 20
+
+# Number of rows appended between fsyncs of a resumable output CSV. Every row
+# is still flushed to the OS as soon as it is written, so only a machine crash
+# (not a killed process) can lose rows since the last fsync.
+RESUME_FSYNC_EVERY = 100
+
+# Supported output file formats
+OUTPUT_FORMATS = ("csv", "parquet")
+
+# Number of rows buffered per Parquet row group
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Number of saved medias between progress updates during a fetch
+_PROGRESS_EVERY = 500
+
+# Serialized form of an empty eligibility_errors list, the common case
+_NO_ELIGIBILITY_ERRORS = "[]"
+
+# Marks a row whose eligibility has not been looked up yet
+_NOT_FETCHED = object()
+
+# Guards the per-run caches shared by the worker threads
+_memo_lock = threading.Lock()
+
+# Creative spec that is identical for every product set ad, encoded once
+_DEGREES_OF_FREEDOM_SPEC = _dumps(
+    {"creative_features_spec": {"product_extensions": {"enroll_status": "OPT_IN"}}}
+)
+
+# Pieces of an Instagram post/reel/tv URL: instagram.com/<kind>/<shortcode>
+_IG_DOMAIN = "instagram.com/"
+_IG_MEDIA_KINDS = frozenset(("p", "reel", "tv"))
+_SHORTCODE_CHARS = string.ascii_letters + string.digits + "_-"
+_STORIES_MARKER = "/stories/"
+
+# Response codes worth retrying: rate limiting and transient server errors
+_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Shared HTTP session so Graph API calls reuse pooled keep-alive connections
+# instead of paying a TCP+TLS handshake per request. Transient failures on
+# idempotent requests are retried with backoff, waiting as long as a 429's
+# Retry-After header asks so a rate limit does not abort a long pagination;
+# POSTs are never retried so an ad is not created twice.
+_session = requests.Session()
+_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=_RETRY_STATUS_CODES,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    ),
+)
+
+
+class FetchError(Exception):
+    """
+    Raised when fetching medias or creating ads cannot continue.
+
+    The cause has already been printed; main() turns it into exit status 1.
+    """
 
 
 def extract_instagram_shortcode(permalink: str) -> str:
@@ -41,22 +189,58 @@ def extract_instagram_shortcode(permalink: str) -> str:
 
     Raises:
         ValueError: If the permalink is a stories URL (not supported)
+
+    Examples:
+        >>> extract_instagram_shortcode("https://www.instagram.com/reel/aBc123XyZ/")
+        'aBc123XyZ'
+        >>> extract_instagram_shortcode("https://www.instagram.com/p/dEf456GhI/")
+        'dEf456GhI'
+        >>> extract_instagram_shortcode("https://www.instagram.com/tv/jKl789MnO/")
+        'jKl789MnO'
+        >>> extract_instagram_shortcode("instagram.com/reel/pQr012StU/")
+        'pQr012StU'
+        >>> extract_instagram_shortcode("https://www.instagram.com/reel/aBc123XyZ?igsh=abc")
+        'aBc123XyZ'
+        >>> extract_instagram_shortcode("https://www.instagram.com/reel/abc123 ")
+        'abc123'
+        >>> extract_instagram_shortcode("https://www.instagram.com/p/abc123&utm=x")
+        'abc123'
+        >>> extract_instagram_shortcode("https://www.instagram.com/p/abc.def")
+        'abc'
+        >>> extract_instagram_shortcode("https://www.instagram.com/p/abc%2F")
+        'abc'
+        >>> extract_instagram_shortcode("bCd678EfG")
+        'bCd678EfG'
+        >>> extract_instagram_shortcode("hIj901KlM/")
+        'hIj901KlM'
+        >>> extract_instagram_shortcode("")
+        ''
+        >>> extract_instagram_shortcode("https://www.instagram.com/stories/username/123456789/")
+        Traceback (most recent call last):
+        ...
+        ValueError: Stories boosting is not supported by this script
+        >>> extract_instagram_shortcode("/stories/12345")
+        Traceback (most recent call last):
+        ...
+        ValueError: Stories boosting is not supported by this script
     """
     if not permalink:
         return permalink
 
     # Check if it's a stories URL
-    if "/stories/" in permalink:
+    if _STORIES_MARKER in permalink:
         raise ValueError("Stories boosting is not supported by this script")
 
-    # Check if it's a URL
-    url_pattern = (
-        r"(?:https?://)?(?:www\.)?instagram\.com/(?:p|reel|tv)/([A-Za-z0-9_-]+)"
-    )
-    match = re.search(url_pattern, permalink)
-
-    if match:
-        return match.group(1)
+    # Check if it's a URL, using plain string operations since this runs per row
+    domain_at = permalink.find(_IG_DOMAIN)
+    while domain_at >= 0:
+        kind, _, rest = permalink[domain_at + len(_IG_DOMAIN) :].partition("/")
+        if kind in _IG_MEDIA_KINDS:
+            # The shortcode ends at the first character a shortcode cannot contain
+            end = len(rest) - len(rest.lstrip(_SHORTCODE_CHARS))
+            if end:
+                return rest[:end]
+        domain_at = permalink.find(_IG_DOMAIN, domain_at + 1)
 
     # If not a URL, assume it's already a shortcode
     return permalink.strip("/")
@@ -89,11 +273,11 @@ def fetch_media_insights(
 
     # Fetch basic metrics (like_count, comments_count) from media object
     try:
-        media_url = f"https://graph.facebook.com/v22.0/{media_id}"
+        media_url = f"{GRAPH_API_URL}{media_id}"
         media_params = {"fields": "like_count,comments_count"}
-        response = requests.get(media_url, headers=headers, params=media_params)
+        response = _session.get(media_url, headers=headers, params=media_params)
         if response.status_code == 200:
-            data = response.json()
+            data = _loads(response.content)
             result["likes"] = data.get("like_count")
             result["comments"] = data.get("comments_count")
     except Exception as e:
@@ -102,14 +286,352 @@ def fetch_media_insights(
     return result
 
 
+def fetch_media_insights_concurrently(
+    access_token: str,
+    media_ids: List[str],
+    max_workers: int = METRICS_MAX_WORKERS,
+) -> Dict[str, Dict[str, Optional[int]]]:
+    """
+    Fetch engagement metrics for many medias, overlapping the API calls.
+
+    Args:
+        access_token: Facebook/Instagram access token
+        media_ids: Instagram media IDs
+        max_workers: Maximum number of requests in flight at once
+
+    Returns:
+        Dict mapping media ID to the metrics returned by fetch_media_insights
+    """
+    if not media_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda media_id: fetch_media_insights(access_token, media_id), media_ids
+        )
+        return dict(zip(media_ids, results))
+
+
+def _fetch_media_basic_metrics_chunk(
+    access_token: str,
+    media_ids: List[str],
+) -> Optional[Dict[str, Dict[str, Optional[int]]]]:
+    """
+    Fetch like and comment counts for up to MEDIA_BATCH_SIZE medias in one request.
+
+    Returns:
+        Dict mapping media ID to likes/comments, or None if the request failed
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+    }
+    params = {
+        "ids": ",".join(media_ids),
+        "fields": "like_count,comments_count",
+    }
+
+    try:
+        response = _session.get(
+            GRAPH_API_URL, headers=headers, params=params
+        )
+        if response.status_code == 200:
+            data = _loads(response.content)
+            return {
+                media_id: {
+                    "likes": data.get(media_id, {}).get("like_count"),
+                    "comments": data.get(media_id, {}).get("comments_count"),
+                }
+                for media_id in media_ids
+            }
+        print(
+            f"Warning: Batch metrics request failed: {response.status_code} - {response.text}"
+        )
+    except Exception as e:
+        print(f"Warning: Batch metrics request failed: {e}")
+
+    return None
+
+
+def fetch_media_basic_metrics_batch(
+    access_token: str,
+    media_ids: List[str],
+    max_workers: int = METRICS_MAX_WORKERS,
+) -> Dict[str, Dict[str, Optional[int]]]:
+    """
+    Fetch engagement metrics for many medias using batched ?ids= requests.
+
+    Media IDs are grouped into chunks of MEDIA_BATCH_SIZE so N medias need only
+    N / MEDIA_BATCH_SIZE requests. If a chunk request fails (e.g. one of its
+    medias is no longer accessible), the medias in that chunk are fetched
+    individually instead.
+
+    Args:
+        access_token: Facebook/Instagram access token
+        media_ids: Instagram media IDs
+        max_workers: Maximum number of requests in flight at once
+
+    Returns:
+        Dict mapping media ID to likes/comments
+    """
+    chunks = [
+        media_ids[i : i + MEDIA_BATCH_SIZE]
+        for i in range(0, len(media_ids), MEDIA_BATCH_SIZE)
+    ]
+    if not chunks:
+        return {}
+
+    metrics = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda chunk: _fetch_media_basic_metrics_chunk(access_token, chunk),
+            chunks,
+        )
+        for chunk, chunk_metrics in zip(chunks, results):
+            if chunk_metrics is None:
+                chunk_metrics = fetch_media_insights_concurrently(
+                    access_token, chunk, max_workers
+                )
+            metrics.update(chunk_metrics)
+
+    return metrics
+
+
+def _open_output(
+    output: Union[str, BinaryIO],
+    mode: str = "w",
+    _open: Callable[..., TextIO] = open,
+) -> TextIO:
+    """
+    Open an output CSV for writing, given either a file path or a binary stream.
+
+    Streams let callers such as the web UI keep the CSV in memory instead of
+    round-tripping it through a file. mode ("w" or "a") and _open only apply
+    to paths.
+    """
+    if isinstance(output, str):
+        return _open(
+            output,
+            mode,
+            newline="",
+            encoding="utf-8",
+            buffering=CSV_WRITE_BUFFER_SIZE,
+        )
+    return io.TextIOWrapper(output, encoding="utf-8", newline="")
+
+
+def _close_output(csvfile: TextIO, output: Union[str, BinaryIO]) -> None:
+    """
+    Close an output opened with _open_output, leaving a caller's stream open.
+    """
+    if isinstance(output, str):
+        csvfile.close()
+    else:
+        csvfile.flush()
+        csvfile.detach()
+
+
+class _CsvRowWriter:
+    """
+    Streams rows to a CSV file path or binary stream.
+    """
+
+    def __init__(
+        self,
+        output: Union[str, BinaryIO],
+        fieldnames: Iterable[str],
+        append: bool = False,
+        _open: Callable[..., TextIO] = open,
+    ):
+        self._output = output
+        self._append = append
+        self._file = _open_output(output, "a" if append else "w", _open)
+        csv_writer = csv.writer(self._file)
+        # An appended file already has its header unless it is empty
+        if not (append and self._file.tell()):
+            csv_writer.writerow(fieldnames)
+        self.writerow = csv_writer.writerow
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def sync(self) -> None:
+        """
+        Flush written rows all the way to disk so they survive a crash.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        try:
+            # A resumed run's file must hold every row it reported as written
+            if self._append:
+                self.sync()
+        finally:
+            _close_output(self._file, self._output)
+
+
+class _ParquetRowWriter:
+    """
+    Writes rows to a zstd-compressed Parquet file path or binary stream.
+
+    Every column is stored as a string so IDs keep their exact value, matching
+    what a CSV reader sees. Rows are written one row group at a time.
+    """
+
+    def __init__(self, output: Union[str, BinaryIO], fieldnames: Iterable[str]):
+        if pq is None:
+            raise ImportError("pyarrow is required for Parquet output")
+        self._schema = pa.schema([(name, pa.string()) for name in fieldnames])
+        self._writer = pq.ParquetWriter(
+            output, self._schema, compression="zstd", compression_level=3
+        )
+        self._rows = []
+
+    def writerow(self, row: Iterable[Any]) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._write_row_group()
+
+    def flush(self) -> None:
+        # Rows are only written in whole row groups; see _write_row_group
+        pass
+
+    def close(self) -> None:
+        self._write_row_group()
+        self._writer.close()
+
+    def _write_row_group(self) -> None:
+        if not self._rows:
+            return
+        columns = [
+            pa.array([None if v is None else str(v) for v in column], pa.string())
+            for column in zip(*self._rows)
+        ]
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=self._schema))
+        self._rows = []
+
+
+def _open_writer(
+    output: Union[str, BinaryIO],
+    fieldnames: Iterable[str],
+    output_format: str,
+    append: bool = False,
+    _open: Callable[..., TextIO] = open,
+) -> Union[_CsvRowWriter, _ParquetRowWriter]:
+    """
+    Open a row writer for output in the given format (see OUTPUT_FORMATS).
+
+    append adds rows to an existing CSV file instead of replacing it.
+    """
+    if output_format == "parquet":
+        if append:
+            raise ValueError("Parquet output cannot be appended to")
+        return _ParquetRowWriter(output, fieldnames)
+    if output_format == "csv":
+        return _CsvRowWriter(output, fieldnames, append, _open)
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def _read_previous_output(
+    output_csv: str,
+    _open: Callable[..., TextIO] = open,
+) -> Tuple[Optional[List[str]], set]:
+    """
+    Read the output CSV of an earlier, possibly interrupted, run.
+
+    If the run was killed mid-row, the torn last line is terminated so rows
+    appended after it start on a line of their own.
+
+    Returns:
+        Tuple of (header or None if there is no previous output, set of
+        (ad_name, ad_set_id) keys of the rows that created an ad)
+    """
+    last_line = ""
+
+    def lines(f):
+        nonlocal last_line
+        for last_line in f:
+            yield last_line
+
+    try:
+        with _open(output_csv, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(lines(f))
+            created = {
+                (row.get("ad_name"), row.get("ad_set_id"))
+                for row in reader
+                if row.get("status") == "success"
+            }
+    except FileNotFoundError:
+        return None, set()
+
+    if last_line and not last_line.endswith("\n"):
+        with _open(output_csv, mode="a", newline="", encoding="utf-8") as f:
+            f.write("\n")
+    return reader.fieldnames, created
+
+
+def iter_advertisable_medias(
+    access_token: str,
+    ig_account_id: str,
+    creator_username: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    Lazily iterate over all advertisable medias for the given Instagram account.
+
+    Pages are requested only as the caller consumes medias, so a caller that
+    stops early (e.g. because of a limit) never requests the remaining pages,
+    and only one page is held in memory at a time.
+
+    Args:
+        access_token: Facebook/Instagram access token
+        ig_account_id: Instagram account ID
+        creator_username: Instagram creator username (optional)
+
+    Yields:
+        Media dicts as returned by the branded_content_advertisable_medias edge
+    """
+    url = f"{GRAPH_API_URL}{ig_account_id}/branded_content_advertisable_medias"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+    }
+    params = {
+        "fields": "eligibility_errors,owner_id,permalink,id,has_permission_for_partnership_ad",
+        "limit": 25,
+    }
+
+    if creator_username:
+        params["creator_username"] = creator_username
+
+    while True:
+        response = _session.get(url, headers=headers, params=params)
+
+        if response.status_code != 200:
+            print(f"Error: {response.status_code} - {response.text}")
+            raise FetchError(f"{response.status_code} - {response.text}")
+
+        response_data = _loads(response.content)
+        yield from response_data.get("data", [])
+
+        if "paging" in response_data and "next" in response_data["paging"]:
+            url = response_data["paging"]["next"]
+            params = {}
+        else:
+            break
+
+
 def fetch_all_advertisable_medias(
     access_token: str,
     ig_account_id: str,
     creator_username: Optional[str] = None,
-    output_csv: str = "advertisable_medias.csv",
+    output_csv: Union[str, BinaryIO] = "advertisable_medias.csv",
     limit: Optional[int] = None,
     only_with_permission: bool = False,
     include_engagement_metrics: bool = False,
+    output_format: str = "csv",
+    progress: Optional[Callable[[int], None]] = None,
+    _open: Callable[..., TextIO] = open,
 ) -> None:
     """
     Fetch all advertisable medias for the given Instagram account and save to CSV.
@@ -118,116 +640,125 @@ def fetch_all_advertisable_medias(
         access_token: Facebook/Instagram access token
         ig_account_id: Instagram account ID
         creator_username: Instagram creator username (optional but recommended to avoid fetching too much data)
-        output_csv: Output CSV file path
+        output_csv: Output CSV file path, or a writable binary stream (e.g. io.BytesIO)
         limit: Maximum number of medias to fetch (optional, fetches all if not specified)
         only_with_permission: If True, only include medias with partnership ad permission
         include_engagement_metrics: If True, fetch engagement metrics (likes, comments, reach, impressions, saves)
+        output_format: "csv" or "parquet" (Parquet requires pyarrow)
+        progress: Called with the number of medias saved so far after each batch
+        _open: Used in place of the open builtin for CSV file paths (for tests)
     """
     creator_info = f" (creator: {creator_username})" if creator_username else ""
     print(
         f"Fetching advertisable medias for IG account {ig_account_id}{creator_info}..."
     )
 
-    url = f"https://graph.facebook.com/v22.0/{ig_account_id}/branded_content_advertisable_medias"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-    }
-    params = {
-        "fields": "eligibility_errors,owner_id,permalink,id,has_permission_for_partnership_ad",
-        "limit": 25,
-    }
+    fieldnames = [
+        "media_id",
+        "permalink",
+        "owner_id",
+        "has_permission_for_partnership_ad",
+        "eligibility_errors",
+    ]
 
-    if creator_username:
-        params["creator_username"] = creator_username
+    # Add engagement metrics columns if they will be fetched
+    if include_engagement_metrics:
+        fieldnames.extend(["likes", "comments"])
 
-    all_medias = []
+    # The output file is opened lazily so nothing is written when no medias match
+    writer = None
+    total_medias = 0
+    unflushed_rows = 0
 
     try:
-        while True:
-            response = requests.get(url, headers=headers, params=params)
+        medias = iter_advertisable_medias(access_token, ig_account_id, creator_username)
 
-            if response.status_code != 200:
-                print(f"Error: {response.status_code} - {response.text}")
-                sys.exit(1)
+        # Apply permission filter if requested
+        if only_with_permission:
+            medias = (
+                m for m in medias if m.get("has_permission_for_partnership_ad", False)
+            )
 
-            response_data = response.json()
+        # Stop pulling pages as soon as the limit is reached
+        if limit:
+            medias = itertools.islice(medias, limit)
 
-            if "data" in response_data:
-                medias = response_data["data"]
+        chunks = iter(lambda: list(itertools.islice(medias, MEDIA_BATCH_SIZE)), [])
 
-                # Apply permission filter if requested
-                if only_with_permission:
-                    medias = [m for m in medias if m.get("has_permission_for_partnership_ad", False)]
+        def with_metrics(chunk):
+            media_ids = [media["id"] for media in chunk if media.get("id")]
+            return chunk, fetch_media_basic_metrics_batch(access_token, media_ids)
 
-                all_medias.extend(medias)
-                print(f"Fetched {len(medias)} medias (Total: {len(all_medias)})")
+        with ThreadPoolExecutor(max_workers=1) as metrics_executor:
+            if include_engagement_metrics:
+                # Fetch one chunk's metrics in the background while the next
+                # page is requested, instead of alternating between the two
+                chunks_with_metrics = _ordered_bounded_map(
+                    metrics_executor, with_metrics, chunks, max_pending=2
+                )
+            else:
+                chunks_with_metrics = ((chunk, {}) for chunk in chunks)
 
-                if limit and len(all_medias) >= limit:
-                    all_medias = all_medias[:limit]
-                    print(f"Reached limit of {limit} medias")
-                    break
+            for chunk, metrics_by_media in chunks_with_metrics:
+                if writer is None:
+                    writer = _open_writer(
+                        output_csv, fieldnames, output_format, _open=_open
+                    )
 
-            if "paging" in response_data and "next" in response_data["paging"]:
-                url = response_data["paging"]["next"]
-                params = {}
-            else:
-                break
+                for media in chunk:
+                    # Only medias that passed the permission filter get here, and
+                    # most have no errors, so skip the encoder for empty lists
+                    errors = media.get("eligibility_errors", [])
+                    row = (
+                        media.get("id", ""),
+                        media.get("permalink", ""),
+                        media.get("owner_id", ""),
+                        media.get("has_permission_for_partnership_ad", False),
+                        _NO_ELIGIBILITY_ERRORS if errors == [] else _dumps(errors),
+                    )
 
-        if not all_medias:
-            print("No advertisable medias found")
-            return
+                    # Attach engagement metrics if they were fetched
+                    if include_engagement_metrics:
+                        metrics = metrics_by_media.get(media.get("id")) or {}
+                        row += (metrics.get("likes", ""), metrics.get("comments", ""))
 
-        csv_rows = []
-        total_medias = len(all_medias)
-        for idx, media in enumerate(all_medias, 1):
-            row = {
-                "media_id": media.get("id", ""),
-                "permalink": media.get("permalink", ""),
-                "owner_id": media.get("owner_id", ""),
-                "has_permission_for_partnership_ad": media.get(
-                    "has_permission_for_partnership_ad", False
-                ),
-                "eligibility_errors": json.dumps(media.get("eligibility_errors", [])),
-            }
+                    writer.writerow(row)
 
-            # Fetch engagement metrics if requested
-            if include_engagement_metrics:
-                media_id = media.get("id")
-                if media_id:
-                    print(f"Fetching metrics for media {idx}/{total_medias}...")
-                    metrics = fetch_media_insights(access_token, media_id)
-                    row["likes"] = metrics.get("likes")
-                    row["comments"] = metrics.get("comments")
-
-            csv_rows.append(row)
-
-        fieldnames = [
-            "media_id",
-            "permalink",
-            "owner_id",
-            "has_permission_for_partnership_ad",
-            "eligibility_errors",
-        ]
+                previous_total = total_medias
+                total_medias += len(chunk)
+                unflushed_rows += len(chunk)
+                if progress:
+                    progress(total_medias)
+                if total_medias // _PROGRESS_EVERY > previous_total // _PROGRESS_EVERY:
+                    print(f"Saved {total_medias} medias so far", flush=True)
 
-        # Add engagement metrics columns if they were fetched
-        if include_engagement_metrics:
-            fieldnames.extend(["likes", "comments"])
-        with open(output_csv, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(csv_rows)
+                # Rows with metrics are slow to produce, so make them visible right away
+                if include_engagement_metrics or unflushed_rows >= CSV_FLUSH_EVERY:
+                    writer.flush()
+                    unflushed_rows = 0
+
+        if not total_medias:
+            print("No advertisable medias found")
+            return
+
+        if limit and total_medias >= limit:
+            print(f"Reached limit of {limit} medias")
 
         print(
-            f"\nSuccessfully saved {len(csv_rows)} advertisable medias to {output_csv}"
+            f"\nSuccessfully saved {total_medias} advertisable medias to {output_csv}"
         )
 
+    except FetchError:
+        raise
     except requests.exceptions.RequestException as e:
         print(f"Request error occurred: {e}")
-        sys.exit(1)
+        raise FetchError(f"Request error occurred: {e}") from e
     except Exception as e:
         print(f"An error occurred: {e}")
-        sys.exit(1)
+        raise FetchError(f"An error occurred: {e}") from e
+    finally:
+        if writer is not None:
+            writer.close()
 
 
 def fetch_branded_content_advertisable_medias(
@@ -248,7 +779,7 @@ def fetch_branded_content_advertisable_medias(
     Returns:
         Dict containing eligibility information or None
     """
-    url = f"https://graph.facebook.com/v22.0/{ig_account_id}/branded_content_advertisable_medias"
+    url = f"{GRAPH_API_URL}{ig_account_id}/branded_content_advertisable_medias"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
@@ -260,13 +791,13 @@ def fetch_branded_content_advertisable_medias(
     if ad_code:
         params["ad_code"] = ad_code
     elif permalinks:
-        params["permalinks"] = json.dumps(permalinks)
+        params["permalinks"] = _dumps(permalinks)
     else:
         raise ValueError("ad_code or permalinks must be passed")
 
-    response = requests.get(url, headers=headers, params=params)
+    response = _session.get(url, headers=headers, params=params)
     if response.status_code == 200:
-        response_data = response.json()
+        response_data = _loads(response.content)
         if "data" in response_data and len(response_data["data"]) > 0:
             print(f"Eligibility: {response_data['data'][0]}")
             return response_data["data"][0]
@@ -277,6 +808,200 @@ def fetch_branded_content_advertisable_medias(
     return None
 
 
+def _post_graph_batch(
+    access_token: str,
+    batch: List[Dict[str, str]],
+) -> Optional[List[Optional[Dict]]]:
+    """
+    Send up to GRAPH_BATCH_SIZE Graph API sub-requests in a single batch request.
+
+    Args:
+        access_token: Facebook/Instagram access token
+        batch: Sub-requests, each with "method" and "relative_url"
+
+    Returns:
+        One response per sub-request (each with "code" and "body", or None if
+        the sub-request timed out), or None if the batch request itself failed
+        or its response could not be parsed
+    """
+    url = GRAPH_API_URL
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+    }
+    data = {
+        "batch": _dumps(batch),
+        "include_headers": "false",
+    }
+
+    try:
+        response = _session.post(url, headers=headers, data=data)
+        if response.status_code == 200:
+            responses = _loads(response.content)
+            if isinstance(responses, list):
+                return responses
+            print("Warning: Batch request returned an unexpected response")
+        else:
+            print(
+                f"Warning: Batch request failed: {response.status_code} - {response.text}"
+            )
+    except requests.exceptions.RequestException as e:
+        print(f"Warning: Batch request failed: {e}")
+    except ValueError as e:
+        # Malformed JSON; orjson's decode error is a ValueError too
+        print(f"Warning: Batch request returned invalid JSON: {e}")
+
+    return None
+
+
+def batch_eligibility(
+    access_token: str,
+    ig_account_id: str,
+    entries: List[Tuple[Any, Optional[str], Optional[List[str]]]],
+) -> Dict[Any, Optional[Dict]]:
+    """
+    Fetch eligibility information for many medias using Graph API batch requests.
+
+    Each entry is looked up exactly like fetch_branded_content_advertisable_medias
+    would, but up to GRAPH_BATCH_SIZE lookups share one HTTP request.
+
+    Args:
+        access_token: Facebook/Instagram access token
+        ig_account_id: Instagram account ID
+        entries: (key, ad_code, permalinks) tuples; ad_code takes precedence
+
+    Returns:
+        Dict mapping entry key to the eligibility information (None if no media
+        was found, {"error": ...} on API error). Keys whose lookup could not be
+        completed, failed with a retryable code (see _RETRY_STATUS_CODES) or
+        returned an unreadable body are left out so callers can fall back to a
+        single, retried request.
+    """
+    results = {}
+    path = f"{ig_account_id}/branded_content_advertisable_medias"
+
+    for i in range(0, len(entries), GRAPH_BATCH_SIZE):
+        chunk = entries[i : i + GRAPH_BATCH_SIZE]
+        batch = []
+        for _, ad_code, permalinks in chunk:
+            params = {
+                "fields": "eligibility_errors,owner_id,permalink,id,has_permission_for_partnership_ad",
+            }
+            if ad_code:
+                params["ad_code"] = ad_code
+            else:
+                params["permalinks"] = _dumps(permalinks)
+            batch.append(
+                {"method": "GET", "relative_url": f"{path}?{urlencode(params)}"}
+            )
+
+        responses = _post_graph_batch(access_token, batch)
+        if not responses:
+            continue
+
+        for (key, _, _), item in zip(chunk, responses):
+            if not isinstance(item, dict):
+                continue
+            code = item.get("code")
+            if code in _RETRY_STATUS_CODES:
+                continue
+            if code != 200:
+                results[key] = {"error": item.get("body")}
+                continue
+            try:
+                body = _loads(item.get("body") or "{}")
+                data = body.get("data") or []
+                results[key] = data[0] if data else None
+            except (ValueError, AttributeError, TypeError, KeyError, IndexError):
+                continue
+
+    return results
+
+
+def _validate_row(row: Dict[str, str]) -> Optional[str]:
+    """
+    Check an input row for problems that can be detected without any API call.
+
+    Returns:
+        An error message if the row cannot produce an ad, otherwise None
+    """
+    required_fields = ("cta_type", "link", "ad_name", "ad_set_id")
+    missing_fields = [k for k in required_fields if not row.get(k)]
+    if missing_fields:
+        return f"Missing required fields: {', '.join(missing_fields)}"
+
+    permalink = row.get("permalink", "")
+    if not permalink and not row.get("ad_code", ""):
+        return "Either permalink or ad_code must be provided"
+
+    if permalink and not row.get("ad_code", ""):
+        try:
+            extract_instagram_shortcode(permalink)
+        except ValueError as e:
+            # Stories URLs are not supported
+            return str(e)
+
+    return None
+
+
+def _eligibility_lookup(
+    row: Dict[str, str],
+) -> Optional[Tuple[Optional[str], Optional[List[str]]]]:
+    """
+    Return the (ad_code, permalinks) used to look up a row's eligibility.
+
+    Returns None for rows that fail validation, so they never reach the API.
+    """
+    if _validate_row(row):
+        return None
+
+    ad_code = row.get("ad_code", "")
+    if ad_code:
+        return ad_code, None
+    return None, [extract_instagram_shortcode(row["permalink"])]
+
+
+def _with_prefetched_eligibility(
+    access_token: str,
+    ig_account_id: str,
+    rows: Iterable[Dict[str, str]],
+) -> Iterator[Tuple[int, Dict[str, str], Any]]:
+    """
+    Lazily pair each row with its eligibility, fetched GRAPH_BATCH_SIZE rows at a time.
+
+    Yields:
+        (1-based row index, row, eligibility or _NOT_FETCHED) tuples
+    """
+    # Rows often repeat the same media across ad sets, so each media is only
+    # looked up once per run
+    eligibility_cache: Dict[Tuple[Optional[str], Optional[str]], Any] = {}
+    indexed_rows = enumerate(rows, 1)
+    while True:
+        chunk = list(itertools.islice(indexed_rows, GRAPH_BATCH_SIZE))
+        if not chunk:
+            return
+
+        row_keys = {}
+        requested = set()
+        entries = []
+        for idx, row in chunk:
+            lookup = _eligibility_lookup(row)
+            if not lookup:
+                continue
+            ad_code, permalinks = lookup
+            key = (ad_code, permalinks[0] if permalinks else None)
+            if key not in eligibility_cache and key not in requested:
+                requested.add(key)
+                entries.append((key, ad_code, permalinks))
+            row_keys[idx] = key
+
+        if entries:
+            eligibility_cache.update(
+                batch_eligibility(access_token, ig_account_id, entries)
+            )
+        for idx, row in chunk:
+            yield idx, row, eligibility_cache.get(row_keys.get(idx), _NOT_FETCHED)
+
+
 def upload_instagram_video(
     access_token: str,
     ad_account_id: str,
@@ -295,7 +1020,7 @@ def upload_instagram_video(
     Returns:
         Tuple of (Video ID or None, Error message or None)
     """
-    url = f"https://graph.facebook.com/v22.0/act_{ad_account_id}/advideos"
+    url = f"{GRAPH_API_URL}act_{ad_account_id}/advideos"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
@@ -308,9 +1033,9 @@ def upload_instagram_video(
         params["partnership_ad_ad_code"] = ad_code
         params["is_partnership_ad"] = True
 
-    response = requests.post(url, headers=headers, params=params)
+    response = _session.post(url, headers=headers, params=params)
     if response.status_code == 200:
-        response_data = response.json()
+        response_data = _loads(response.content)
         if "id" in response_data:
             print(f"Video uploaded successfully with ID: {response_data['id']}")
             return response_data["id"], None
@@ -324,6 +1049,31 @@ def upload_instagram_video(
         return None, error
 
 
+@functools.lru_cache(maxsize=None)
+def _branded_content_params(
+    facebook_page_id: str, ig_account_id: str
+) -> Dict[str, str]:
+    """
+    Encode the sponsor params, which are the same for every creative in a run.
+    """
+    return {
+        "facebook_branded_content": _dumps({"sponsor_page_id": facebook_page_id}),
+        "instagram_branded_content": _dumps({"sponsor_id": ig_account_id}),
+    }
+
+
+@functools.lru_cache(maxsize=1024)
+def _call_to_action_json(cta_type: str, link: str, app_link: Optional[str]) -> str:
+    """
+    Encode the call_to_action param; input rows usually share a few CTAs.
+    """
+    # Build CTA value object based on available parameters
+    cta_value = {"link": link}
+    if app_link:
+        cta_value["app_link"] = app_link
+    return _dumps({"type": cta_type, "value": cta_value})
+
+
 def create_ad_creative(
     access_token: str,
     ad_account_id: str,
@@ -354,31 +1104,19 @@ def create_ad_creative(
     Returns:
         Tuple of (Creative ID or None, Error message or None)
     """
-    url = f"https://graph.facebook.com/v23.0/act_{ad_account_id}/adcreatives"
+    url = f"{GRAPH_API_CREATIVES_URL}act_{ad_account_id}/adcreatives"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
     }
     params = {
         "object_id": facebook_page_id,
-        "facebook_branded_content": json.dumps({"sponsor_page_id": facebook_page_id}),
-        "instagram_branded_content": json.dumps({"sponsor_id": ig_account_id}),
+        **_branded_content_params(facebook_page_id, ig_account_id),
+        "call_to_action": _call_to_action_json(cta_type, link, app_link),
     }
 
-    # Build CTA value object based on available parameters
-    cta_value = {"link": link}
-    if app_link:
-        cta_value["app_link"] = app_link
-
-    params["call_to_action"] = json.dumps(
-        {
-            "type": cta_type,
-            "value": cta_value,
-        }
-    )
-
     if ad_code:
-        params["branded_content"] = json.dumps(
+        params["branded_content"] = _dumps(
             {"instagram_boost_post_access_token": ad_code}
         )
     elif source_instagram_media_id:
@@ -387,20 +1125,14 @@ def create_ad_creative(
         raise ValueError("ad_code or source_instagram_media_id must be passed")
 
     if product_set_id:
-        params["degrees_of_freedom_spec"] = json.dumps(
-            {
-                "creative_features_spec": {
-                    "product_extensions": {"enroll_status": "OPT_IN"}
-                }
-            }
-        )
-        params["creative_sourcing_spec"] = json.dumps(
+        params["degrees_of_freedom_spec"] = _DEGREES_OF_FREEDOM_SPEC
+        params["creative_sourcing_spec"] = _dumps(
             {"associated_product_set_id": f"{product_set_id}"}
         )
 
     try:
-        response = requests.post(url, headers=headers, params=params)
-        response_data = response.json()
+        response = _session.post(url, headers=headers, params=params)
+        response_data = _loads(response.content)
         if response.status_code == 200:
             if "id" in response_data:
                 print(f"creative_id: {response_data['id']}")
@@ -445,7 +1177,7 @@ def create_ad(
     Returns:
         Tuple of (Ad ID or None, Error message or None)
     """
-    url = f"https://graph.facebook.com/v22.0/act_{ad_account_id}/ads"
+    url = f"{GRAPH_API_URL}act_{ad_account_id}/ads"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
@@ -454,11 +1186,11 @@ def create_ad(
         "status": "PAUSED",
         "name": ad_name,
         "adset_id": ad_set_id,
-        "creative": json.dumps({"creative_id": creative_id}),
+        "creative": _dumps({"creative_id": creative_id}),
     }
     try:
-        response = requests.post(url, headers=headers, params=params)
-        response_data = response.json()
+        response = _session.post(url, headers=headers, params=params)
+        response_data = _loads(response.content)
         if response.status_code == 200:
             if "id" in response_data:
                 published_ad_id = response_data["id"]
@@ -483,14 +1215,308 @@ def create_ad(
     )
 
 
+def _ordered_bounded_map(
+    executor: ThreadPoolExecutor,
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_pending: int,
+    pending: Optional[deque] = None,
+) -> Iterator[R]:
+    """
+    Lazily map fn over items on executor, yielding results in input order.
+
+    At most max_pending items are submitted ahead of the result being yielded,
+    so items are pulled from the input only as fast as they are processed.
+
+    If iteration stops early (an exception, or the generator is closed), the
+    items not started yet are cancelled. Pass a deque as pending to see the
+    futures whose results were not yielded, e.g. to record the ones that
+    finished anyway.
+    """
+    if pending is None:
+        pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_pending:
+                # Only drop the future once its result is in hand
+                result = pending[0].result()
+                pending.popleft()
+                yield result
+        while pending:
+            result = pending[0].result()
+            pending.popleft()
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _memoize(
+    cache: Dict[Any, Future],
+    key: Any,
+    fn: Callable[[], R],
+    keep: Optional[Callable[[R], bool]] = None,
+) -> R:
+    """
+    Return fn()'s result for key, calling fn at most once per key.
+
+    Safe to call from several threads: a thread asking for a key that another
+    thread is still computing waits for that result instead of recomputing it.
+    Only successes are cached: if fn raises, or keep(result) is false, the key
+    is forgotten so the next caller tries again. Callers already waiting on
+    that attempt still get its outcome.
+    """
+    with _memo_lock:
+        future = cache.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = cache[key] = Future()
+
+    if is_owner:
+        try:
+            result = fn()
+        except BaseException as e:
+            _forget(cache, key)
+            future.set_exception(e)
+        else:
+            if keep is not None and not keep(result):
+                _forget(cache, key)
+            future.set_result(result)
+    return future.result()
+
+
+def _forget(cache: Dict[Any, Future], key: Any) -> None:
+    with _memo_lock:
+        cache.pop(key, None)
+
+
+# Columns appended to each input row in the ad creation output
+_OUTCOME_FIELDS = ("status", "error", "video_id", "creative_id", "published_ad_id")
+
+
+@dataclass(slots=True)
+class _RowOutcome:
+    """
+    Result of processing one input CSV row, written out as one output row.
+    """
+
+    row: Dict[str, str]
+    status: str
+    error: str = ""
+    video_id: str = ""
+    creative_id: str = ""
+    published_ad_id: str = ""
+
+
+def _fail(
+    row: Dict[str, str],
+    error: str,
+    *,
+    video_id: Optional[str] = "",
+    creative_id: Optional[str] = "",
+    published_ad_id: Optional[str] = "",
+) -> _RowOutcome:
+    """
+    Build the outcome for an input row that failed to produce an ad.
+    """
+    return _RowOutcome(
+        row,
+        "failed",
+        error,
+        video_id or "",
+        creative_id or "",
+        published_ad_id or "",
+    )
+
+
+def _process_row(
+    idx: int,
+    row: Dict[str, str],
+    access_token: str,
+    ig_account_id: str,
+    ad_account_id: str,
+    facebook_page_id: str,
+    eligibility: Any = _NOT_FETCHED,
+    video_cache: Optional[Dict[Any, Future]] = None,
+) -> _RowOutcome:
+    """
+    Create a partnership ad for a single input CSV row.
+
+    Runs the eligibility -> video upload -> creative -> ad chain for the row.
+    Rows are independent of each other, so this is safe to call concurrently.
+
+    Args:
+        idx: 1-based position of the row, used for progress output
+        row: Input CSV row
+        access_token: Facebook/Instagram access token
+        ig_account_id: Instagram account ID
+        ad_account_id: Ad account ID
+        facebook_page_id: Facebook page ID
+        eligibility: Eligibility already fetched for this row, if any
+        video_cache: Videos already uploaded during this run, shared between rows
+
+    Returns:
+        The row's outcome, with status, error, video_id, creative_id and
+        published_ad_id
+    """
+    print(f"\n[{idx}] Processing: {row.get('ad_name', 'Unknown')}")
+
+    permalink = row.get("permalink", "")
+    ad_code = row.get("ad_code", "")
+    cta_type = row.get("cta_type")
+    link = row.get("link")
+    app_link = row.get("app_link", "")
+    ad_name = row.get("ad_name")
+    ad_set_id = row.get("ad_set_id")
+    product_set_id = row.get("product_set_id", "")
+
+    error_msg = _validate_row(row)
+    if error_msg:
+        print(f"Error: {error_msg}")
+        return _fail(row, error_msg)
+
+    video_id = None
+    video_error = None
+    creative_id = None
+    creative_error = None
+    published_ad_id = None
+    ad_error = None
+    eligibility_error = None
+
+    try:
+        if eligibility is not _NOT_FETCHED:
+            # Already looked up in a batch request
+            pass
+        elif ad_code:
+            # When ad_code is provided, it already has permission
+            eligibility = fetch_branded_content_advertisable_medias(
+                access_token, ig_account_id, ad_code=ad_code
+            )
+        else:
+            # Stories URLs were already rejected by _validate_row
+            shortcode = extract_instagram_shortcode(permalink)
+            eligibility = fetch_branded_content_advertisable_medias(
+                access_token, ig_account_id, permalinks=[shortcode]
+            )
+
+        if not eligibility:
+            eligibility_error = "Failed to fetch media eligibility"
+        elif eligibility.get("error"):
+            eligibility_error = f"API Error: {eligibility.get('error')}"
+        elif not ad_code and not eligibility.get(
+            "has_permission_for_partnership_ad"
+        ):
+            # Only check permission if using permalink (ad_code already has permission)
+            eligibility_error = (
+                "Media does not have permission for partnership ads"
+            )
+        elif (
+            eligibility.get("eligibility_errors")
+            and len(eligibility.get("eligibility_errors", [])) > 0
+        ):
+            errors = eligibility.get("eligibility_errors", [])
+            eligibility_error = f"Eligibility errors: {', '.join(errors)}"
+
+        if eligibility_error:
+            print(f"Eligibility check failed: {eligibility_error}")
+            return _fail(row, eligibility_error)
+
+        source_instagram_media_id = eligibility.get("id")
+        if not source_instagram_media_id:
+            error_msg = "Media ID not found in eligibility response"
+            print(f"Error: {error_msg}")
+            return _fail(row, error_msg)
+
+        def upload():
+            return upload_instagram_video(
+                access_token,
+                ad_account_id,
+                source_instagram_media_id,
+                ad_code if ad_code else None,
+            )
+
+        if video_cache is None:
+            video_id, video_error = upload()
+        else:
+            # The same media is uploaded once and reused by every row that boosts it
+            # A failed upload is not cached, so the next row retries it
+            video_id, video_error = _memoize(
+                video_cache,
+                (source_instagram_media_id, ad_code),
+                upload,
+                keep=lambda result: result[0] is not None,
+            )
+
+        if not video_id:
+            print(f"Video upload failed: {video_error}")
+            return _fail(row, video_error or "Video upload failed")
+
+        creative_id, creative_error = create_ad_creative(
+            access_token,
+            ad_account_id,
+            facebook_page_id,
+            ig_account_id,
+            source_instagram_media_id,
+            ad_code if ad_code else None,
+            cta_type,
+            link,
+            app_link if app_link else None,
+            product_set_id if product_set_id else None,
+        )
+
+        if not creative_id:
+            print(f"Creative creation failed: {creative_error}")
+            return _fail(
+                row, creative_error or "Creative creation failed", video_id=video_id
+            )
+
+        published_ad_id, ad_error = create_ad(
+            access_token, ad_account_id, ad_name, ad_set_id, creative_id
+        )
+
+        if not published_ad_id:
+            print(f"Ad creation failed: {ad_error}")
+            return _fail(
+                row,
+                ad_error or "Ad creation failed",
+                video_id=video_id,
+                creative_id=creative_id,
+            )
+
+        return _RowOutcome(
+            row,
+            "success",
+            video_id=video_id,
+            creative_id=creative_id,
+            published_ad_id=published_ad_id,
+        )
+
+    except Exception as e:
+        error_msg = f"Unexpected error: {str(e)}"
+        print(f"Error: {error_msg}")
+        return _fail(
+            row,
+            error_msg,
+            video_id=video_id,
+            creative_id=creative_id,
+            published_ad_id=published_ad_id,
+        )
+
+
 def create_partnership_ads_from_csv(
     access_token: str,
     ig_account_id: str,
     ad_account_id: str,
     facebook_page_id: str,
-    input_csv: str,
-    output_csv: str = "created_ads_output.csv",
-) -> None:
+    input_csv: Union[str, Iterable[Dict[str, str]]],
+    output_csv: Union[str, BinaryIO] = "created_ads_output.csv",
+    max_workers: int = CREATE_MAX_WORKERS,
+    output_format: str = "csv",
+    resume: bool = False,
+    progress: Optional[Callable[[int], None]] = None,
+    _open: Callable[..., TextIO] = open,
+) -> Counter:
     """
     Create partnership ads from input CSV file.
 
@@ -509,236 +1535,157 @@ def create_partnership_ads_from_csv(
         ig_account_id: Instagram account ID
         ad_account_id: Ad account ID
         facebook_page_id: Facebook page ID
-        input_csv: Input CSV file path
-        output_csv: Output CSV file path
-    """
-    print(f"Reading input CSV: {input_csv}")
+        input_csv: Input CSV file path, or already parsed rows (e.g. a csv.DictReader)
+        output_csv: Output CSV file path, or a writable binary stream (e.g. io.BytesIO)
+        max_workers: Maximum number of rows processed concurrently, capped at
+            HTTP_POOL_SIZE
+        output_format: "csv" or "parquet" (Parquet requires pyarrow)
+        resume: If True, append to output_csv and skip input rows whose
+            (ad_name, ad_set_id) already created an ad in it. Failed rows are
+            retried. Requires a CSV output path.
+        progress: Called with the number of rows processed so far after each row
+        _open: Used in place of the open builtin for CSV file paths (for tests)
 
+    Returns:
+        Counter of output row statuses ("success" / "failed")
+    """
+    # More workers than pooled connections would only churn connections
+    max_workers = min(max_workers, HTTP_POOL_SIZE)
+    writer = None
     try:
-        rows = []
-        with open(input_csv, mode="r", encoding="utf-8") as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                rows.append(row)
-
-        if not rows:
-            print("No rows found in input CSV")
-            return
-
-        print(f"Processing {len(rows)} rows...")
-
-        output_rows = []
-        for idx, row in enumerate(rows, 1):
-            print(f"\n[{idx}/{len(rows)}] Processing: {row.get('ad_name', 'Unknown')}")
-
-            output_row = row.copy()
-
-            permalink = row.get("permalink", "")
-            ad_code = row.get("ad_code", "")
-            cta_type = row.get("cta_type")
-            link = row.get("link")
-            app_link = row.get("app_link", "")
-            ad_name = row.get("ad_name")
-            ad_set_id = row.get("ad_set_id")
-            product_set_id = row.get("product_set_id", "")
-
-            required_fields = {
-                "cta_type": cta_type,
-                "link": link,
-                "ad_name": ad_name,
-                "ad_set_id": ad_set_id,
-            }
-
-            missing_fields = [k for k, v in required_fields.items() if not v]
-            if missing_fields:
-                error_msg = f"Missing required fields: {', '.join(missing_fields)}"
-                print(f"Error: {error_msg}")
-                output_row["status"] = "failed"
-                output_row["error"] = error_msg
-                output_row["video_id"] = ""
-                output_row["creative_id"] = ""
-                output_row["published_ad_id"] = ""
-                output_rows.append(output_row)
-                continue
-
-            if not permalink and not ad_code:
-                error_msg = "Either permalink or ad_code must be provided"
-                print(f"Error: {error_msg}")
-                output_row["status"] = "failed"
-                output_row["error"] = error_msg
-                output_row["video_id"] = ""
-                output_row["creative_id"] = ""
-                output_row["published_ad_id"] = ""
-                output_rows.append(output_row)
-                continue
-
-            video_id = None
-            video_error = None
-            creative_id = None
-            creative_error = None
-            published_ad_id = None
-            ad_error = None
-            eligibility_error = None
+        previous_header, created = None, set()
+        if resume:
+            if output_format != "csv" or not isinstance(output_csv, str):
+                raise ValueError("resume requires a CSV output file path")
+            previous_header, created = _read_previous_output(output_csv, _open)
+            print(f"Resuming: {len(created)} ads already created in {output_csv}")
+
+        with ExitStack() as stack:
+            if isinstance(input_csv, str):
+                print(f"Reading input CSV: {input_csv}")
+                # utf-8-sig drops the BOM that Excel writes at the start of a CSV
+                input_file = _open(input_csv, mode="r", encoding="utf-8-sig")
+                csv_reader = csv.DictReader(stack.enter_context(input_file))
+            else:
+                csv_reader = input_csv
+            if created:
+                csv_reader = (
+                    row
+                    for row in csv_reader
+                    if (row.get("ad_name"), row.get("ad_set_id")) not in created
+                )
 
-            try:
-                if ad_code:
-                    # When ad_code is provided, it already has permission
-                    eligibility = fetch_branded_content_advertisable_medias(
-                        access_token, ig_account_id, ad_code=ad_code
-                    )
-                elif permalink:
-                    # Extract shortcode from permalink if it's a URL
-                    # This will raise ValueError if it's a stories URL
-                    try:
-                        shortcode = extract_instagram_shortcode(permalink)
-                    except ValueError as e:
-                        # Stories URLs are not supported
-                        eligibility_error = str(e)
-                        print(f"Eligibility check failed: {eligibility_error}")
-                        output_row["status"] = "failed"
-                        output_row["error"] = eligibility_error
-                        output_row["video_id"] = ""
-                        output_row["creative_id"] = ""
-                        output_row["published_ad_id"] = ""
-                        output_rows.append(output_row)
-                        continue
-
-                    eligibility = fetch_branded_content_advertisable_medias(
-                        access_token, ig_account_id, permalinks=[shortcode]
-                    )
-                else:
-                    eligibility = None
-
-                if not eligibility:
-                    eligibility_error = "Failed to fetch media eligibility"
-                elif eligibility.get("error"):
-                    eligibility_error = f"API Error: {eligibility.get('error')}"
-                elif not ad_code and not eligibility.get(
-                    "has_permission_for_partnership_ad"
-                ):
-                    # Only check permission if using permalink (ad_code already has permission)
-                    eligibility_error = (
-                        "Media does not have permission for partnership ads"
-                    )
-                elif (
-                    eligibility.get("eligibility_errors")
-                    and len(eligibility.get("eligibility_errors", [])) > 0
-                ):
-                    errors = eligibility.get("eligibility_errors", [])
-                    eligibility_error = f"Eligibility errors: {', '.join(errors)}"
-
-                if eligibility_error:
-                    print(f"Eligibility check failed: {eligibility_error}")
-                    output_row["status"] = "failed"
-                    output_row["error"] = eligibility_error
-                    output_row["video_id"] = ""
-                    output_row["creative_id"] = ""
-                    output_row["published_ad_id"] = ""
-                    output_rows.append(output_row)
-                    continue
-
-                source_instagram_media_id = eligibility.get("id")
-                if not source_instagram_media_id:
-                    error_msg = "Media ID not found in eligibility response"
-                    print(f"Error: {error_msg}")
-                    output_row["status"] = "failed"
-                    output_row["error"] = error_msg
-                    output_row["video_id"] = ""
-                    output_row["creative_id"] = ""
-                    output_row["published_ad_id"] = ""
-                    output_rows.append(output_row)
-                    continue
-
-                video_id, video_error = upload_instagram_video(
-                    access_token,
-                    ad_account_id,
-                    source_instagram_media_id,
-                    ad_code if ad_code else None,
+            # The output columns come from the first row. They are checked and
+            # the output opened before any row is submitted, so a resume into
+            # a mismatched file fails without creating ads. Nothing is written
+            # for an empty input.
+            rows = iter(csv_reader)
+            first_row = next(rows, None)
+            if first_row is None:
+                print("No rows found in input CSV")
+                return Counter()
+            input_fields = tuple(k for k in first_row if k not in _OUTCOME_FIELDS)
+            fieldnames = input_fields + _OUTCOME_FIELDS
+            if previous_header and tuple(previous_header) != fieldnames:
+                raise ValueError(
+                    f"Cannot resume: {output_csv} has different columns than the input"
                 )
+            writer = _open_writer(
+                output_csv, fieldnames, output_format, append=resume, _open=_open
+            )
 
-                if not video_id:
-                    print(f"Video upload failed: {video_error}")
-                    output_row["status"] = "failed"
-                    output_row["error"] = video_error or "Video upload failed"
-                    output_row["video_id"] = ""
-                    output_row["creative_id"] = ""
-                    output_row["published_ad_id"] = ""
-                    output_rows.append(output_row)
-                    continue
-
-                creative_id, creative_error = create_ad_creative(
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+            video_cache = {}
+            pending = deque()
+            outcomes = _ordered_bounded_map(
+                executor,
+                lambda item: _process_row(
+                    item[0],
+                    item[1],
                     access_token,
+                    ig_account_id,
                     ad_account_id,
                     facebook_page_id,
-                    ig_account_id,
-                    source_instagram_media_id,
-                    ad_code if ad_code else None,
-                    cta_type,
-                    link,
-                    app_link if app_link else None,
-                    product_set_id if product_set_id else None,
-                )
+                    item[2],
+                    video_cache,
+                ),
+                _with_prefetched_eligibility(
+                    access_token, ig_account_id, itertools.chain([first_row], rows)
+                ),
+                max_pending=max_workers * 2,
+                pending=pending,
+            )
 
-                if not creative_id:
-                    print(f"Creative creation failed: {creative_error}")
-                    output_row["status"] = "failed"
-                    output_row["error"] = creative_error or "Creative creation failed"
-                    output_row["video_id"] = video_id or ""
-                    output_row["creative_id"] = ""
-                    output_row["published_ad_id"] = ""
-                    output_rows.append(output_row)
-                    continue
-
-                published_ad_id, ad_error = create_ad(
-                    access_token, ad_account_id, ad_name, ad_set_id, creative_id
+            processed = 0
+            status_counts = Counter()
+
+            def record(outcome: _RowOutcome) -> None:
+                nonlocal processed
+                writer.writerow(
+                    (
+                        *(outcome.row.get(k, "") for k in input_fields),
+                        outcome.status,
+                        outcome.error,
+                        outcome.video_id,
+                        outcome.creative_id,
+                        outcome.published_ad_id,
+                    )
                 )
+                processed += 1
+                status_counts[outcome.status] += 1
+                # A resumable run hands every row to the OS as soon as it is
+                # written, so a killed run never loses a row whose ad exists
+                if resume and processed % RESUME_FSYNC_EVERY == 0:
+                    writer.sync()
+                elif resume or processed % CSV_FLUSH_EVERY == 0:
+                    writer.flush()
+                if progress:
+                    progress(processed)
+
+            try:
+                for outcome in outcomes:
+                    record(outcome)
+            except BaseException:
+                # Interrupted (e.g. Ctrl-C): drop the rows not started yet, let
+                # the running ones finish, and record every finished row, since
+                # its ad may already exist
+                executor.shutdown(cancel_futures=True)
+                for future in pending:
+                    if not future.cancelled() and future.exception() is None:
+                        record(future.result())
+                raise
 
-                if not published_ad_id:
-                    print(f"Ad creation failed: {ad_error}")
-                    output_row["status"] = "failed"
-                    output_row["error"] = ad_error or "Ad creation failed"
-                    output_row["video_id"] = video_id or ""
-                    output_row["creative_id"] = creative_id or ""
-                    output_row["published_ad_id"] = ""
-                    output_rows.append(output_row)
-                    continue
-
-                output_row["status"] = "success"
-                output_row["error"] = ""
-                output_row["video_id"] = video_id or ""
-                output_row["creative_id"] = creative_id or ""
-                output_row["published_ad_id"] = published_ad_id or ""
-                output_rows.append(output_row)
-
-            except Exception as e:
-                error_msg = f"Unexpected error: {str(e)}"
-                print(f"Error: {error_msg}")
-                output_row["status"] = "failed"
-                output_row["error"] = error_msg
-                output_row["video_id"] = video_id or ""
-                output_row["creative_id"] = creative_id or ""
-                output_row["published_ad_id"] = published_ad_id or ""
-                output_rows.append(output_row)
-
-        fieldnames = list(output_rows[0].keys()) if output_rows else []
-        with open(output_csv, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(output_rows)
-
-        successful = len([r for r in output_rows if r.get("status") == "success"])
         print(f"\n\nSummary:")
-        print(f"Total rows processed: {len(output_rows)}")
-        print(f"Successful: {successful}")
-        print(f"Failed: {len(output_rows) - successful}")
+        print(f"Total rows processed: {processed}")
+        print(f"Successful: {status_counts['success']}")
+        print(f"Failed: {status_counts['failed']}")
         print(f"Results saved to: {output_csv}")
+        return status_counts
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(f"Error: The file {input_csv} was not found.")
-        sys.exit(1)
+        raise FetchError(f"The file {input_csv} was not found.") from e
     except Exception as e:
         print(f"An error occurred: {e}")
-        sys.exit(1)
+        raise FetchError(f"An error occurred: {e}") from e
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _worker_count(value: str) -> int:
+    """
+    argparse type for --max-workers: an int from 1 to HTTP_POOL_SIZE.
+    """
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if not 1 <= count <= HTTP_POOL_SIZE:
+        raise argparse.ArgumentTypeError(
+            f"must be between 1 and {HTTP_POOL_SIZE}, got {count}"
+        )
+    return count
 
 
 def main():
@@ -782,7 +1729,7 @@ Examples:
     )
     parser.add_argument(
         "--output-csv",
-        help="Output CSV file path (default: advertisable_medias.csv for fetch, created_ads_output.csv for create)",
+        help="Output file path (default: advertisable_medias.<format> for fetch, created_ads_output.<format> for create)",
     )
     parser.add_argument(
         "--only-with-permission",
@@ -794,19 +1741,40 @@ Examples:
         action="store_true",
         help="Include engagement metrics (likes, comments) - slower (fetch mode only)",
     )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Output file format; parquet requires pyarrow (default: csv)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to an existing output CSV and skip rows that already created an ad (create mode only)",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=_worker_count,
+        default=CREATE_MAX_WORKERS,
+        help=f"Number of rows processed concurrently, 1 to {HTTP_POOL_SIZE}; lower it if the ad account hits rate limits (create mode only, default: {CREATE_MAX_WORKERS})",
+    )
 
     args = parser.parse_args()
 
     if args.mode == "fetch":
-        output_csv = args.output_csv or "advertisable_medias.csv"
-        fetch_all_advertisable_medias(
-            args.access_token,
-            args.ig_account_id,
-            args.creator_username,
-            output_csv,
-            only_with_permission=args.only_with_permission,
-            include_engagement_metrics=args.include_metrics,
-        )
+        output_csv = args.output_csv or f"advertisable_medias.{args.format}"
+        try:
+            fetch_all_advertisable_medias(
+                args.access_token,
+                args.ig_account_id,
+                args.creator_username,
+                output_csv,
+                only_with_permission=args.only_with_permission,
+                include_engagement_metrics=args.include_metrics,
+                output_format=args.format,
+            )
+        except FetchError:
+            sys.exit(1)
 
     elif args.mode == "create":
         if not args.ad_account_id:
@@ -819,15 +1787,21 @@ Examples:
             print("Error: --input-csv is required for create mode")
             sys.exit(1)
 
-        output_csv = args.output_csv or "created_ads_output.csv"
-        create_partnership_ads_from_csv(
-            args.access_token,
-            args.ig_account_id,
-            args.ad_account_id,
-            args.facebook_page_id,
-            args.input_csv,
-            output_csv,
-        )
+        output_csv = args.output_csv or f"created_ads_output.{args.format}"
+        try:
+            create_partnership_ads_from_csv(
+                args.access_token,
+                args.ig_account_id,
+                args.ad_account_id,
+                args.facebook_page_id,
+                args.input_csv,
+                output_csv,
+                max_workers=args.max_workers,
+                output_format=args.format,
+                resume=args.resume,
+            )
+        except FetchError:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -8,19 +8,180 @@ Instructions to run:
 $python3 -m venv venv
 $source venv/bin/activate
 $pip install requests
-$pip install streamlit pandas
+$pip install streamlit pandas pyarrow
 $streamlit run partnership_ads_ui.py
 """
 
+import csv
 import io
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import streamlit as st
 from partnership_ads_booster import (
+    CREATE_MAX_WORKERS,
+    HTTP_POOL_SIZE,
+    OUTPUT_FORMATS,
     fetch_all_advertisable_medias,
     create_partnership_ads_from_csv,
 )
 
 
+# Maximum number of rows sent to the browser for a preview table
+PREVIEW_ROWS = 500
+
+# Content types offered for each output format download
+_MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Bounds on the parsed input previews kept in server memory across reruns
+_PREVIEW_CACHE_ENTRIES = 8
+_PREVIEW_CACHE_TTL_SECONDS = 60 * 60
+
+# Input columns shown in the create tab's preview
+_INPUT_PREVIEW_COLUMNS = (
+    "ad_name",
+    "ad_set_id",
+    "permalink",
+    "ad_code",
+    "cta_type",
+    "link",
+)
+
+# ID columns are read as strings to prevent JavaScript integer overflow, and
+# the two-valued status column as a category (dictionary-encoded)
+_COLUMN_TYPES = {
+    **{
+        column: pa.string()
+        for column in (
+            "ad_set_id",
+            "video_id",
+            "creative_id",
+            "published_ad_id",
+            "media_id",
+            "owner_id",
+        )
+    },
+    "status": pa.dictionary(pa.int32(), pa.string()),
+}
+
+
+def _read_csv(source) -> pd.DataFrame:
+    """
+    Read a CSV path or buffer with Arrow's multithreaded parser.
+    """
+    table = pacsv.read_csv(
+        source, convert_options=pacsv.ConvertOptions(column_types=_COLUMN_TYPES)
+    )
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _read_csv_head(source, nrows: int, columns=None) -> pd.DataFrame:
+    """
+    Read only the first nrows rows of a CSV path or buffer, for previews.
+
+    If columns is given, only those columns are parsed; each must exist.
+    """
+    reader = pacsv.open_csv(
+        source,
+        convert_options=pacsv.ConvertOptions(
+            column_types=_COLUMN_TYPES, include_columns=columns
+        ),
+    )
+    batches = []
+    rows = 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows >= nrows:
+            break
+    table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, nrows)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _load_csv(data: bytes) -> pd.DataFrame:
+    """
+    Parse CSV bytes.
+    """
+    return _read_csv(io.BytesIO(data))
+
+
+def _load_csv_head(data: bytes, nrows: int, columns=None) -> pd.DataFrame:
+    """
+    Parse the first nrows rows of CSV bytes.
+
+    If columns is given, only those of them present in the header are parsed.
+    """
+    if columns is not None:
+        # utf-8-sig drops the BOM Excel writes, as Arrow does when parsing
+        header_line = data.split(b"\n", 1)[0].decode("utf-8-sig")
+        header = next(csv.reader([header_line]), [])
+        columns = [column for column in columns if column in header]
+    return _read_csv_head(io.BytesIO(data), nrows, columns)
+
+
+@st.cache_data(
+    show_spinner=False,
+    max_entries=_PREVIEW_CACHE_ENTRIES,
+    ttl=_PREVIEW_CACHE_TTL_SECONDS,
+)
+def _load_input_preview(data: bytes, nrows: int, columns=None) -> pd.DataFrame:
+    """
+    _load_csv_head for an uploaded input, memoized across Streamlit reruns.
+
+    Only inputs are cached: each run's results are new bytes, so caching them
+    would never hit and would only hold every run's frame in memory.
+    """
+    return _load_csv_head(data, nrows, columns)
+
+
+def _count_rows(data: bytes) -> int:
+    """
+    Count the data rows of a CSV by counting line breaks, without parsing it.
+
+    Assumes no quoted field spans several lines, which holds for the fetch
+    output and for the input format documented below.
+    """
+    lines = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _load_parquet(data: bytes) -> pd.DataFrame:
+    """
+    Parse Parquet bytes.
+    """
+    table = pq.read_table(io.BytesIO(data))
+    if "status" in table.column_names:
+        # Match the categorical status column read from CSV results
+        table = table.set_column(
+            table.column_names.index("status"),
+            "status",
+            table["status"].dictionary_encode(),
+        )
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _load_parquet_head(data: bytes, nrows: int) -> pd.DataFrame:
+    """
+    Parse the first nrows rows of Parquet bytes.
+    """
+    batches = pq.ParquetFile(io.BytesIO(data)).iter_batches(batch_size=nrows)
+    batch = next(batches, None)
+    if batch is None:
+        return pd.DataFrame()
+    return batch.to_pandas()
+
+
+def _download_name(filename: str, output_format: str) -> str:
+    """
+    Give the download the extension of the chosen output format.
+    """
+    return f"{os.path.splitext(filename)[0]}.{output_format}"
+
+
 def main():
     st.set_page_config(
         page_title="Partnership Ads Booster",
@@ -84,6 +245,13 @@ def main():
                 help="Name for the output CSV file",
             )
 
+            output_format = st.radio(
+                "Output Format",
+                OUTPUT_FORMATS,
+                horizontal=True,
+                help="Parquet files are smaller and faster to load than CSV",
+            )
+
             submit_fetch = st.form_submit_button("🔍 Fetch Medias", type="primary")
 
         if submit_fetch:
@@ -96,40 +264,59 @@ def main():
                         if include_metrics:
                             st.info("⏳ Fetching engagement metrics (likes, comments) requires additional API calls per media. This may take a while...")
 
-                        # Use a temporary file path
-                        temp_output = f"/tmp/{output_filename}"
+                        # Report progress as batches are saved; the total is only
+                        # known up front when a limit is set
+                        fetch_limit = limit if limit and limit > 0 else None
+                        progress_bar = st.progress(0.0)
+
+                        def report_fetch_progress(saved):
+                            text = f"Fetched {saved:,} medias"
+                            if fetch_limit:
+                                progress_bar.progress(min(saved / fetch_limit, 1.0), text)
+                            else:
+                                progress_bar.progress(0.0, text)
+
+                        # Keep the output in memory rather than in a temporary file
+                        output_buffer = io.BytesIO()
                         fetch_all_advertisable_medias(
                             access_token,
                             ig_account_id,
                             creator_username if creator_username else None,
-                            temp_output,
-                            limit if limit and limit > 0 else None,
+                            output_buffer,
+                            fetch_limit,
                             only_with_permission,
                             include_metrics,
+                            output_format,
+                            progress=report_fetch_progress,
                         )
+                        progress_bar.empty()
 
-                        # Read the CSV and display preview
-                        # Ensure ID columns are read as strings to prevent JavaScript integer overflow
-                        df = pd.read_csv(
-                            temp_output,
-                            dtype={
-                                'media_id': str,
-                                'owner_id': str,
-                            }
-                        )
-                        st.success(f"✅ Successfully fetched {len(df)} medias!")
-
-                        # Display preview
-                        st.subheader("Preview")
-                        st.dataframe(df, use_container_width=True)
-
-                        # Download button
-                        with open(temp_output, "rb") as f:
+                        if not output_buffer.getbuffer().nbytes:
+                            st.warning("⚠️ No advertisable medias found.")
+                        else:
+                            # Read only the head of the CSV for the preview
+                            output_data = output_buffer.getvalue()
+                            if output_format == "parquet":
+                                row_count = pq.read_metadata(
+                                    io.BytesIO(output_data)
+                                ).num_rows
+                                df = _load_parquet_head(output_data, PREVIEW_ROWS)
+                            else:
+                                row_count = _count_rows(output_data)
+                                df = _load_csv_head(output_data, PREVIEW_ROWS)
+                            st.success(f"✅ Successfully fetched {row_count} medias!")
+
+                            # Display preview
+                            st.subheader("Preview")
+                            st.dataframe(df, use_container_width=True)
+                            st.caption(f"Showing {len(df):,} of {row_count:,} rows")
+
+                            # Download button
                             st.download_button(
-                                label="⬇️ Download CSV",
-                                data=f.read(),
-                                file_name=output_filename,
-                                mime="text/csv",
+                                label=f"⬇️ Download {output_format.upper()}",
+                                data=output_data,
+                                file_name=_download_name(output_filename, output_format),
+                                mime=_MIME_TYPES[output_format],
                             )
 
                     except Exception as e:
@@ -182,12 +369,28 @@ def main():
                 help="Upload the CSV file with ad information",
             )
 
+            max_workers = st.number_input(
+                "Concurrent Rows",
+                min_value=1,
+                max_value=HTTP_POOL_SIZE,
+                value=CREATE_MAX_WORKERS,
+                help="Number of rows processed in parallel. Lower it if the ad account hits API rate limits.",
+            )
+
             output_filename_create = st.text_input(
                 "Output Filename",
                 value="created_ads_output.csv",
                 help="Name for the output CSV file with results",
             )
 
+            output_format_create = st.radio(
+                "Output Format",
+                OUTPUT_FORMATS,
+                horizontal=True,
+                key="create_output_format",
+                help="Parquet files are smaller and faster to load than CSV",
+            )
+
             submit_create = st.form_submit_button("🎯 Create Ads", type="primary")
 
         if submit_create:
@@ -200,54 +403,52 @@ def main():
             else:
                 with st.spinner("Creating partnership ads..."):
                     try:
-                        # Save uploaded file temporarily
-                        temp_input = f"/tmp/input_{uploaded_file.name}"
-                        temp_output_create = f"/tmp/{output_filename_create}"
-
-                        with open(temp_input, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
-                        # Show input preview - read with string dtypes for ID columns
-                        input_df = pd.read_csv(
-                            temp_input,
-                            dtype={
-                                'ad_set_id': str,
-                                'media_id': str,
-                                'owner_id': str,
-                            }
+                        # Show input preview
+                        input_data = uploaded_file.getvalue()
+                        input_df = _load_input_preview(
+                            input_data, 10, _INPUT_PREVIEW_COLUMNS
                         )
                         st.subheader("Input CSV Preview")
-                        st.dataframe(input_df.head(10), use_container_width=True)
-                        st.info(f"📊 Total rows to process: {len(input_df)}")
+                        st.dataframe(input_df, use_container_width=True)
+                        total_rows = _count_rows(input_data)
+                        st.info(f"📊 Total rows to process: {total_rows}")
+                        progress_bar = st.progress(0.0)
+
+                        def report_create_progress(processed):
+                            progress_bar.progress(
+                                min(processed / max(total_rows, 1), 1.0),
+                                f"Processed {processed:,} of {total_rows:,} rows",
+                            )
 
-                        # Create ads
-                        create_partnership_ads_from_csv(
+                        # Create ads straight from the uploaded rows, keeping the
+                        # results in memory
+                        input_rows = csv.DictReader(
+                            io.StringIO(input_data.decode("utf-8-sig"), newline="")
+                        )
+                        output_buffer = io.BytesIO()
+                        status_counts = create_partnership_ads_from_csv(
                             access_token,
                             ig_account_id,
                             ad_account_id,
                             facebook_page_id,
-                            temp_input,
-                            temp_output_create,
+                            input_rows,
+                            output_buffer,
+                            max_workers=int(max_workers),
+                            output_format=output_format_create,
+                            progress=report_create_progress,
                         )
+                        progress_bar.empty()
 
-                        # Read results with string dtypes for ID columns
-                        results_df = pd.read_csv(
-                            temp_output_create,
-                            dtype={
-                                'ad_set_id': str,
-                                'video_id': str,
-                                'creative_id': str,
-                                'published_ad_id': str,
-                                'media_id': str,
-                                'owner_id': str,
-                            }
-                        )
+                        # Read results
+                        output_data = output_buffer.getvalue()
+                        if output_format_create == "parquet":
+                            results_df = _load_parquet(output_data)
+                        else:
+                            results_df = _load_csv(output_data)
 
-                        # Calculate statistics
-                        successful = len(
-                            results_df[results_df["status"] == "success"]
-                        )
-                        failed = len(results_df[results_df["status"] == "failed"])
+                        # Statistics are counted while the results are written
+                        successful = status_counts["success"]
+                        failed = status_counts["failed"]
 
                         # Display results
                         col1, col2, col3 = st.columns(3)
@@ -260,24 +461,36 @@ def main():
 
                         # Show results table
                         st.subheader("Results")
-                        st.dataframe(results_df, use_container_width=True)
+                        st.dataframe(
+                            results_df.head(PREVIEW_ROWS), use_container_width=True
+                        )
+                        st.caption(
+                            f"Showing {min(len(results_df), PREVIEW_ROWS):,} of {len(results_df):,} rows"
+                        )
 
                         # Show errors if any
                         if failed > 0:
                             st.subheader("❌ Failed Ads")
-                            failed_df = results_df[results_df["status"] == "failed"][
-                                ["ad_name", "ad_set_id", "error"]
-                            ]
+                            # Filter once, then cap what is sent to the browser
+                            failed_df = results_df.loc[
+                                results_df["status"] == "failed",
+                                ["ad_name", "ad_set_id", "error"],
+                            ].head(PREVIEW_ROWS)
                             st.dataframe(failed_df, use_container_width=True)
+                            if failed > PREVIEW_ROWS:
+                                st.caption(
+                                    f"Showing {PREVIEW_ROWS:,} of {failed:,} failed ads; download the results for all of them"
+                                )
 
                         # Download button
-                        with open(temp_output_create, "rb") as f:
-                            st.download_button(
-                                label="⬇️ Download Results CSV",
-                                data=f.read(),
-                                file_name=output_filename_create,
-                                mime="text/csv",
-                            )
+                        st.download_button(
+                            label=f"⬇️ Download Results {output_format_create.upper()}",
+                            data=output_data,
+                            file_name=_download_name(
+                                output_filename_create, output_format_create
+                            ),
+                            mime=_MIME_TYPES[output_format_create],
+                        )
 
                         if successful > 0:
                             st.success(
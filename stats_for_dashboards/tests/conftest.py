@@ -0,0 +1,93 @@
+import csv
+import functools
+import io
+import json
+from unittest.mock import create_autospec, MagicMock
+
+import pytest
+import requests
+from stats_for_dashboards import partnership_ads_booster
+
+
+class _InMemoryFile(io.StringIO):
+    """StringIO that keeps its contents readable after being closed"""
+
+    def close(self):
+        pass
+
+
+class InMemoryFiles(dict):
+    """
+    Fake filesystem for the booster's _open hook, mapping paths to StringIOs.
+
+    Seed inputs with files["input.csv"] = "...", read outputs with
+    files["out.csv"].getvalue() or files.rows("out.csv").
+    """
+
+    def __setitem__(self, path, content):
+        if isinstance(content, str):
+            content = _InMemoryFile(content)
+        super().__setitem__(path, content)
+
+    def open(self, path, mode="r", **kwargs):
+        if mode.startswith("r"):
+            if path not in self:
+                raise FileNotFoundError(path)
+            return _InMemoryFile(self[path].getvalue())
+        if mode.startswith("a") and path in self:
+            self[path].seek(0, io.SEEK_END)
+        else:
+            self[path] = _InMemoryFile()
+        return self[path]
+
+    def rows(self, path):
+        """Parse a written CSV into a list of dicts, one per data row"""
+        return list(csv.DictReader(io.StringIO(self[path].getvalue())))
+
+
+@pytest.fixture
+def fake_files():
+    return InMemoryFiles()
+
+
+@pytest.fixture(scope="module")
+def _session_template():
+    """Autospec of requests.Session, built once per test module"""
+    return create_autospec(requests.Session, instance=True)
+
+
+@pytest.fixture
+def mock_get(_session_template, monkeypatch):
+    """Patch the shared session's get with the cached autospec'd mock"""
+    mock = _session_template.get
+    mock.reset_mock(return_value=True, side_effect=True)
+    monkeypatch.setattr(partnership_ads_booster._session, "get", mock)
+    return mock
+
+
+@pytest.fixture
+def mock_post(_session_template, monkeypatch):
+    """Patch the shared session's post with the cached autospec'd mock"""
+    mock = _session_template.post
+    mock.reset_mock(return_value=True, side_effect=True)
+    monkeypatch.setattr(partnership_ads_booster._session, "post", mock)
+    return mock
+
+
+@pytest.fixture(scope="module")
+def response_factory():
+    """
+    Build fake Graph API responses, reusing one per (status, payload, text).
+
+    The responses are shared between tests, so treat them as read-only.
+    """
+
+    @functools.lru_cache(maxsize=None)
+    def build(status_code, content, text):
+        return MagicMock(status_code=status_code, content=content, text=text)
+
+    def response(status_code=200, payload=None, text=""):
+        content = b"" if payload is None else json.dumps(payload).encode()
+        return build(status_code, content, text)
+
+    return response
@@ -1,93 +1,148 @@
 import csv
+import doctest
+import importlib.util
 import json
 import sys
-from io import StringIO
-from unittest.mock import call, MagicMock, mock_open, patch
+from io import BytesIO, StringIO
+from types import MappingProxyType
+from unittest.mock import call, MagicMock, patch
 
 import pytest
 from stats_for_dashboards import partnership_ads_booster
 
+PAB = partnership_ads_booster
+
+# Called directly by many tests, so bound once
+fetch_all = partnership_ads_booster.fetch_all_advertisable_medias
+
+
+def _media(i):
+    return {
+        "id": f"media_{i}",
+        "permalink": f"https://instagram.com/p/{i}",
+        "owner_id": f"owner_{i}",
+        "has_permission_for_partnership_ad": True,
+        "eligibility_errors": [],
+    }
+
+
+# Two pages of three medias. The responses are only read, so tests share
+# them: mock_get.side_effect = list(_PAGE_RESPONSES)
+_PAGES = (
+    {
+        "data": [_media(i) for i in range(3)],
+        "paging": {"next": "https://graph.facebook.com/v22.0/next_page"},
+    },
+    {"data": [_media(i) for i in range(3, 6)], "paging": {}},
+)
+_PAGE_RESPONSES = tuple(
+    MagicMock(status_code=200, content=json.dumps(page).encode()) for page in _PAGES
+)
+
+# Command lines for main(); install with monkeypatch.setattr(sys, "argv", list(...))
+_ARGV_FETCH = (
+    "partnership_ads_booster.py",
+    "--mode",
+    "fetch",
+    "--access-token",
+    "test_token",
+    "--ig-account-id",
+    "123456",
+)
+_ARGV_CREATE = (
+    "partnership_ads_booster.py",
+    "--mode",
+    "create",
+    "--access-token",
+    "test_token",
+    "--ig-account-id",
+    "123456",
+)
+_ARGV_CREATE_FULL = _ARGV_CREATE + (
+    "--ad-account-id",
+    "789",
+    "--facebook-page-id",
+    "999",
+    "--input-csv",
+    "input.csv",
+)
+
+# Graph API payloads shared by the upload/creative/ad tests; with
+# response_factory, tests using the same payload share one response
+_VIDEO_OK = {"id": "video_123"}
+_CREATIVE_OK = {"id": "creative_123"}
+_AD_OK = {"id": "ad_123"}
+_BAD_REQUEST = {"error": "Bad Request"}
+
+# Input CSVs for create_partnership_ads_from_csv
+_SAMPLE_CREATE_CSV = (
+    "media_id,permalink,owner_id,has_permission_for_partnership_ad,eligibility_errors,ad_set_id,cta_type,link,app_link,ad_name,ad_code,product_set_id\n"
+    "media_123,https://instagram.com/p/abc123,owner_123,True,[],adset_123,INSTALL_MOBILE_APP,https://app.link/install,myapp://landing,Test Ad 1,,\n"
+)
+
+# The same media boosted in two ad sets
+_SAME_MEDIA_TWICE_CSV = (
+    "permalink,cta_type,link,ad_name,ad_set_id\n"
+    "https://instagram.com/p/abc123,LEARN_MORE,https://example.com,Ad 1,adset_1\n"
+    "https://instagram.com/p/abc123,LEARN_MORE,https://example.com,Ad 2,adset_2\n"
+)
+
+_TEN_ROWS_CSV = "permalink,cta_type,link,ad_name,ad_set_id\n" + "".join(
+    f"https://instagram.com/p/code{i},LEARN_MORE,https://example.com,Ad {i},adset_{i}\n"
+    for i in range(10)
+)
+
+_MISSING_FIELDS_CSV = (
+    "media_id,permalink,ad_set_id,cta_type,ad_name\n"
+    "media_123,https://instagram.com/p/abc123,,,Test Ad 1\n"
+)
+
+_STORIES_CSV = (
+    "permalink,cta_type,link,app_link,ad_name,ad_set_id,ad_code,product_set_id\n"
+    "https://www.instagram.com/stories/username/123456/,INSTALL_MOBILE_APP,https://app.link,myapp://landing,Test Ad,adset_123,,,\n"
+)
+
 
 class TestExtractInstagramShortcode:
     """Tests for extract_instagram_shortcode function"""
 
-    def test_extract_from_reel_url(self):
-        url = "https://www.instagram.com/reel/aBc123XyZ/"
-        result = partnership_ads_booster.extract_instagram_shortcode(url)
-        assert result == "aBc123XyZ"
-
-    def test_extract_from_post_url(self):
-        url = "https://www.instagram.com/p/dEf456GhI/"
-        result = partnership_ads_booster.extract_instagram_shortcode(url)
-        assert result == "dEf456GhI"
-
-    def test_extract_from_tv_url(self):
-        url = "https://www.instagram.com/tv/jKl789MnO/"
-        result = partnership_ads_booster.extract_instagram_shortcode(url)
-        assert result == "jKl789MnO"
-
-    def test_extract_from_url_without_https(self):
-        url = "instagram.com/reel/pQr012StU/"
-        result = partnership_ads_booster.extract_instagram_shortcode(url)
-        assert result == "pQr012StU"
-
-    def test_extract_from_url_with_www(self):
-        url = "https://www.instagram.com/reel/vWx345YzA/"
-        result = partnership_ads_booster.extract_instagram_shortcode(url)
-        assert result == "vWx345YzA"
-
-    def test_shortcode_only(self):
-        shortcode = "bCd678EfG"
-        result = partnership_ads_booster.extract_instagram_shortcode(shortcode)
-        assert result == "bCd678EfG"
-
-    def test_shortcode_with_trailing_slash(self):
-        shortcode = "hIj901KlM/"
-        result = partnership_ads_booster.extract_instagram_shortcode(shortcode)
-        assert result == "hIj901KlM"
-
-    def test_empty_string(self):
-        result = partnership_ads_booster.extract_instagram_shortcode("")
-        assert result == ""
-
-    def test_stories_url_raises_error(self):
-        url = "https://www.instagram.com/stories/username/123456789/"
-        with pytest.raises(ValueError, match="Stories boosting is not supported"):
-            partnership_ads_booster.extract_instagram_shortcode(url)
-
-    def test_stories_in_shortcode_raises_error(self):
-        # Test that a shortcode with "/stories/" in it also raises an error
-        shortcode = "/stories/12345"
-        with pytest.raises(ValueError, match="Stories boosting is not supported"):
-            partnership_ads_booster.extract_instagram_shortcode(shortcode)
-
-
-@pytest.fixture
+    def test_docstring_examples(self):
+        # The cases live as examples in the function's docstring
+        finder = doctest.DocTestFinder()
+        runner = doctest.DocTestRunner()
+        for test in finder.find(partnership_ads_booster.extract_instagram_shortcode):
+            runner.run(test)
+        results = runner.summarize(verbose=False)
+        assert results.attempted == 14
+        assert results.failed == 0
+
+
+@pytest.fixture(scope="module")
 def mock_creator_username():
     return "test_creator"
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_access_token():
     return "test_access_token"
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_ig_account_id():
     return "17841400875057971"
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_ad_account_id():
     return "1549883851784009"
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_facebook_page_id():
     return "102988293558"
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_media_response():
     return {
         "data": [
@@ -110,38 +165,82 @@ def sample_media_response():
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_csv_rows():
-    return [
-        {
-            "media_id": "media_123",
-            "permalink": "https://instagram.com/p/abc123",
-            "owner_id": "owner_123",
-            "has_permission_for_partnership_ad": "True",
-            "eligibility_errors": "[]",
-            "ad_set_id": "adset_123",
-            "cta_type": "INSTALL_MOBILE_APP",
-            "link": "https://app.link/install",
-            "app_link": "myapp://landing",
-            "ad_name": "Test Ad 1",
-            "ad_code": "",
-            "product_set_id": "",
-        }
-    ]
+    # Shared by the whole module, so the rows are read-only
+    return (
+        MappingProxyType(
+            {
+                "media_id": "media_123",
+                "permalink": "https://instagram.com/p/abc123",
+                "owner_id": "owner_123",
+                "has_permission_for_partnership_ad": "True",
+                "eligibility_errors": "[]",
+                "ad_set_id": "adset_123",
+                "cta_type": "INSTALL_MOBILE_APP",
+                "link": "https://app.link/install",
+                "app_link": "myapp://landing",
+                "ad_name": "Test Ad 1",
+                "ad_code": "",
+                "product_set_id": "",
+            }
+        ),
+    )
+
+
+class TestJsonHelpers:
+    """Tests for the _dumps/_loads JSON helpers"""
+
+    @pytest.fixture
+    def without_orjson(self, monkeypatch):
+        # A separate copy of the module, imported as if orjson were missing
+        monkeypatch.setitem(sys.modules, "orjson", None)
+        spec = importlib.util.spec_from_file_location(
+            "partnership_ads_booster_without_orjson", partnership_ads_booster.__file__
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_dumps_keeps_non_ascii(self):
+        assert partnership_ads_booster._dumps({"link": "https://café.example/é"}) == (
+            '{"link":"https://café.example/é"}'
+        )
+
+    def test_fallback_dumps_matches(self, without_orjson):
+        value = {"link": "https://café.example/é", "errors": ["ÜNGÜLTIG"]}
+        assert without_orjson._dumps(value) == partnership_ads_booster._dumps(value)
+        assert without_orjson._dumps(value) == (
+            '{"link":"https://café.example/é","errors":["ÜNGÜLTIG"]}'
+        )
+
+
+class TestSession:
+    """Tests for the shared HTTP session"""
+
+    def test_retries_rate_limited_gets(self):
+        retry = partnership_ads_booster._session.get_adapter(
+            "https://graph.facebook.com"
+        ).max_retries
+        assert retry.total == 5
+        assert 429 in retry.status_forcelist
+        assert retry.respect_retry_after_header
+        assert not retry.is_retry("POST", 429)
 
 
 class TestFetchMediaInsights:
     """Tests for fetch_media_insights function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_media_insights_success(self, mock_get, mock_access_token):
         """Test successful fetch of likes and comments"""
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "like_count": 150,
-            "comments_count": 25,
-        }
+        mock_response.content = json.dumps(
+            {
+                "like_count": 150,
+                "comments_count": 25,
+            }
+        ).encode()
         mock_get.return_value = mock_response
 
         result = partnership_ads_booster.fetch_media_insights(
@@ -151,7 +250,6 @@ class TestFetchMediaInsights:
         assert result["likes"] == 150
         assert result["comments"] == 25
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_media_insights_api_error(self, mock_get, mock_access_token):
         """Test that API errors return None values gracefully"""
         mock_response = MagicMock()
@@ -165,15 +263,16 @@ class TestFetchMediaInsights:
         assert result["likes"] is None
         assert result["comments"] is None
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_media_insights_partial_data(self, mock_get, mock_access_token):
         """Test handling of partial data from API"""
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "like_count": 100,
-            # comments_count missing
-        }
+        mock_response.content = json.dumps(
+            {
+                "like_count": 100,
+                # comments_count missing
+            }
+        ).encode()
         mock_get.return_value = mock_response
 
         result = partnership_ads_booster.fetch_media_insights(
@@ -183,422 +282,504 @@ class TestFetchMediaInsights:
         assert result["likes"] == 100
         assert result["comments"] is None
 
+    @patch.object(PAB, "fetch_media_insights")
+    def test_fetch_media_insights_concurrently(
+        self, mock_fetch_insights, mock_access_token
+    ):
+        """Test that metrics are fetched for every media and keyed by media ID"""
+        mock_fetch_insights.side_effect = lambda token, media_id: {
+            "likes": len(media_id),
+            "comments": None,
+        }
+
+        result = partnership_ads_booster.fetch_media_insights_concurrently(
+            mock_access_token, ["media_1", "media_22"]
+        )
+
+        assert mock_fetch_insights.call_count == 2
+        assert result == {
+            "media_1": {"likes": 7, "comments": None},
+            "media_22": {"likes": 8, "comments": None},
+        }
+
+
+class TestFetchMediaBasicMetricsBatch:
+    """Tests for fetch_media_basic_metrics_batch function"""
+
+    def test_batch_success(self, mock_get, mock_access_token):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps(
+            {
+                "media_1": {"id": "media_1", "like_count": 10, "comments_count": 2},
+                "media_2": {"id": "media_2", "like_count": 20},
+            }
+        ).encode()
+        mock_get.return_value = mock_response
+
+        result = partnership_ads_booster.fetch_media_basic_metrics_batch(
+            mock_access_token, ["media_1", "media_2"]
+        )
+
+        mock_get.assert_called_once()
+        assert mock_get.call_args[1]["params"]["ids"] == "media_1,media_2"
+        assert result == {
+            "media_1": {"likes": 10, "comments": 2},
+            "media_2": {"likes": 20, "comments": None},
+        }
+
+    def test_batch_splits_into_chunks(self, mock_get, mock_access_token):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps({}).encode()
+        mock_get.return_value = mock_response
+
+        media_ids = [f"media_{i}" for i in range(120)]
+        result = partnership_ads_booster.fetch_media_basic_metrics_batch(
+            mock_access_token, media_ids
+        )
+
+        assert mock_get.call_count == 3
+        assert set(result) == set(media_ids)
+
+    @patch.object(PAB, "fetch_media_insights")
+    def test_batch_falls_back_to_single_requests(
+        self, mock_fetch_insights, mock_get, mock_access_token
+    ):
+        mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_response.text = "Bad Request"
+        mock_get.return_value = mock_response
+        mock_fetch_insights.return_value = {"likes": 1, "comments": 1}
+
+        result = partnership_ads_booster.fetch_media_basic_metrics_batch(
+            mock_access_token, ["media_1", "media_2"]
+        )
+
+        assert mock_fetch_insights.call_count == 2
+        assert result["media_1"] == {"likes": 1, "comments": 1}
+
+    def test_batch_empty(self, mock_access_token):
+        assert (
+            partnership_ads_booster.fetch_media_basic_metrics_batch(
+                mock_access_token, []
+            )
+            == {}
+        )
+
+
+class TestIterAdvertisableMedias:
+    """Tests for iter_advertisable_medias function"""
+
+    def test_iter_fetches_pages_lazily(
+        self, mock_get, mock_access_token, mock_ig_account_id
+    ):
+        """Test that the next page is only requested once the current one is consumed"""
+        mock_response_1 = MagicMock()
+        mock_response_1.status_code = 200
+        mock_response_1.content = json.dumps(
+            {
+                "data": [{"id": "media_1"}],
+                "paging": {"next": "https://graph.facebook.com/v22.0/next_page"},
+            }
+        ).encode()
+        mock_response_2 = MagicMock()
+        mock_response_2.status_code = 200
+        mock_response_2.content = json.dumps({"data": [{"id": "media_2"}]}).encode()
+        mock_get.side_effect = [mock_response_1, mock_response_2]
+
+        medias = partnership_ads_booster.iter_advertisable_medias(
+            mock_access_token, mock_ig_account_id
+        )
+
+        assert next(medias) == {"id": "media_1"}
+        assert mock_get.call_count == 1
+        assert list(medias) == [{"id": "media_2"}]
+        assert mock_get.call_count == 2
+        assert mock_get.call_args[1]["params"] == {}
+
 
 class TestFetchAllAdvertisableMedias:
     """Tests for fetch_all_advertisable_medias function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
+    @pytest.fixture(autouse=True)
+    def _patch_get(self, mock_get):
+        # Every test here pages through the Graph API with the session's get
+        self.mock_get = mock_get
+
     def test_fetch_all_advertisable_medias_success(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
         sample_media_response,
+        fake_files,
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = sample_media_response
-        mock_get.return_value = mock_response
+        mock_response.content = json.dumps(sample_media_response).encode()
+        self.mock_get.return_value = mock_response
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
+            _open=fake_files.open,
         )
 
-        mock_get.assert_called_once()
-        mock_file.assert_called_once_with(
-            "test_output.csv", "w", newline="", encoding="utf-8"
-        )
+        self.mock_get.assert_called_once()
+        assert list(fake_files) == ["test_output.csv"]
 
-        handle = mock_file()
-        written_content = "".join(call.args[0] for call in handle.write.call_args_list)
-        assert "media_id" in written_content
-        assert "media_123" in written_content
-        assert "media_456" in written_content
+        rows = fake_files.rows("test_output.csv")
+        assert [row["media_id"] for row in rows] == ["media_123", "media_456"]
+        assert rows[1]["eligibility_errors"] == '["ERROR_1"]'
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
     def test_fetch_all_advertisable_medias_with_pagination(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
+        fake_files,
     ):
-        first_response = {
-            "data": [
-                {
-                    "id": "media_1",
-                    "permalink": "https://instagram.com/p/1",
-                    "owner_id": "owner_1",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-            ],
-            "paging": {"next": "https://graph.facebook.com/v22.0/next_page"},
-        }
-
-        second_response = {
-            "data": [
-                {
-                    "id": "media_2",
-                    "permalink": "https://instagram.com/p/2",
-                    "owner_id": "owner_2",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-            ],
-            "paging": {},
-        }
-
-        mock_response_1 = MagicMock()
-        mock_response_1.status_code = 200
-        mock_response_1.json.return_value = first_response
-
-        mock_response_2 = MagicMock()
-        mock_response_2.status_code = 200
-        mock_response_2.json.return_value = second_response
-
-        mock_get.side_effect = [mock_response_1, mock_response_2]
+        self.mock_get.side_effect = list(_PAGE_RESPONSES)
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
+            _open=fake_files.open,
         )
 
-        assert mock_get.call_count == 2
+        assert self.mock_get.call_count == 2
+
+        # Rows from both pages are streamed into a single file with one header
+        assert list(fake_files) == ["test_output.csv"]
+        rows = fake_files.rows("test_output.csv")
+        assert [row["media_id"] for row in rows] == [f"media_{i}" for i in range(6)]
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_all_advertisable_medias_api_error(
-        self, mock_get, mock_access_token, mock_ig_account_id, mock_creator_username
+        self, mock_access_token, mock_ig_account_id, mock_creator_username
     ):
         mock_response = MagicMock()
         mock_response.status_code = 400
         mock_response.text = "Bad Request"
-        mock_get.return_value = mock_response
+        self.mock_get.return_value = mock_response
 
-        with pytest.raises(SystemExit) as exc_info:
-            partnership_ads_booster.fetch_all_advertisable_medias(
+        with pytest.raises(partnership_ads_booster.FetchError):
+            fetch_all(
                 mock_access_token,
                 mock_ig_account_id,
                 mock_creator_username,
                 "test_output.csv",
             )
-        assert exc_info.value.code == 1
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
     def test_fetch_all_advertisable_medias_no_data(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
+        fake_files,
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"data": [], "paging": {}}
-        mock_get.return_value = mock_response
+        mock_response.content = json.dumps({"data": [], "paging": {}}).encode()
+        self.mock_get.return_value = mock_response
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
+            _open=fake_files.open,
         )
 
-        mock_file.assert_not_called()
+        assert not fake_files
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
     def test_fetch_all_advertisable_medias_without_creator_username(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         sample_media_response,
+        fake_files,
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = sample_media_response
-        mock_get.return_value = mock_response
+        mock_response.content = json.dumps(sample_media_response).encode()
+        self.mock_get.return_value = mock_response
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
-            mock_access_token, mock_ig_account_id, None, "test_output.csv"
+        fetch_all(
+            mock_access_token,
+            mock_ig_account_id,
+            None,
+            "test_output.csv",
+            _open=fake_files.open,
         )
 
-        mock_get.assert_called_once()
+        self.mock_get.assert_called_once()
         # Verify creator_username is not in params when None
-        call_args = mock_get.call_args
+        call_args = self.mock_get.call_args
         assert "creator_username" not in call_args[1]["params"]
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
     def test_fetch_all_advertisable_medias_with_limit(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
+        fake_files,
     ):
         """Test that limit parameter correctly limits the number of fetched medias"""
-        # Create response with 5 medias across 2 pages
-        first_response = {
-            "data": [
-                {
-                    "id": f"media_{i}",
-                    "permalink": f"https://instagram.com/p/{i}",
-                    "owner_id": f"owner_{i}",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-                for i in range(3)
-            ],
-            "paging": {"next": "https://graph.facebook.com/v22.0/next_page"},
-        }
-
-        second_response = {
-            "data": [
-                {
-                    "id": f"media_{i}",
-                    "permalink": f"https://instagram.com/p/{i}",
-                    "owner_id": f"owner_{i}",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-                for i in range(3, 6)
-            ],
-            "paging": {},
-        }
-
-        mock_response_1 = MagicMock()
-        mock_response_1.status_code = 200
-        mock_response_1.json.return_value = first_response
-
-        mock_response_2 = MagicMock()
-        mock_response_2.status_code = 200
-        mock_response_2.json.return_value = second_response
-
-        mock_get.side_effect = [mock_response_1, mock_response_2]
+        self.mock_get.side_effect = list(_PAGE_RESPONSES)
 
         # Set limit to 2, should only get 2 medias
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
             limit=2,
+            _open=fake_files.open,
         )
 
         # Should only make 1 API call since limit is reached after first response
-        assert mock_get.call_count == 1
+        assert self.mock_get.call_count == 1
 
         # Verify output file was written with limited results
-        handle = mock_file()
-        written_content = "".join(call.args[0] for call in handle.write.call_args_list)
-        # Should contain media_0 and media_1 but not media_2
-        assert "media_0" in written_content
-        assert "media_1" in written_content
-        assert "media_2" not in written_content
-
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
+        rows = fake_files.rows("test_output.csv")
+        assert [row["media_id"] for row in rows] == ["media_0", "media_1"]
+
     def test_fetch_all_advertisable_medias_limit_none(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
+        fake_files,
     ):
         """Test that when limit is None, all medias are fetched"""
-        first_response = {
-            "data": [
-                {
-                    "id": "media_1",
-                    "permalink": "https://instagram.com/p/1",
-                    "owner_id": "owner_1",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-            ],
-            "paging": {"next": "https://graph.facebook.com/v22.0/next_page"},
-        }
-
-        second_response = {
-            "data": [
-                {
-                    "id": "media_2",
-                    "permalink": "https://instagram.com/p/2",
-                    "owner_id": "owner_2",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-            ],
-            "paging": {},
-        }
-
-        mock_response_1 = MagicMock()
-        mock_response_1.status_code = 200
-        mock_response_1.json.return_value = first_response
-
-        mock_response_2 = MagicMock()
-        mock_response_2.status_code = 200
-        mock_response_2.json.return_value = second_response
-
-        mock_get.side_effect = [mock_response_1, mock_response_2]
+        self.mock_get.side_effect = list(_PAGE_RESPONSES)
 
         # No limit - should fetch all pages
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
             limit=None,
+            _open=fake_files.open,
         )
 
         # Should make 2 API calls to get all pages
-        assert mock_get.call_count == 2
+        assert self.mock_get.call_count == 2
+
+        # Verify the medias from both pages are in output
+        rows = fake_files.rows("test_output.csv")
+        assert [row["media_id"] for row in rows] == [f"media_{i}" for i in range(6)]
+
+    def test_fetch_all_advertisable_medias_to_stream(
+        self,
+        mock_access_token,
+        mock_ig_account_id,
+        sample_media_response,
+    ):
+        """Test that output can be written to an in-memory binary stream"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps(sample_media_response).encode()
+        self.mock_get.return_value = mock_response
+
+        buf = BytesIO()
+        fetch_all(
+            mock_access_token, mock_ig_account_id, output_csv=buf
+        )
+
+        # The caller's stream is left open for reading
+        rows = list(csv.DictReader(StringIO(buf.getvalue().decode("utf-8"))))
+        assert [row["media_id"] for row in rows] == ["media_123", "media_456"]
+
+    def test_fetch_all_advertisable_medias_throttles_progress(
+        self,
+        capsys,
+        mock_access_token,
+        mock_ig_account_id,
+        fake_files,
+    ):
+        """Test that progress is reported every _PROGRESS_EVERY medias, not per page"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps(
+            {
+                "data": [{"id": f"media_{i}"} for i in range(600)]
+            }
+        ).encode()
+        self.mock_get.return_value = mock_response
+
+        fetch_all(
+            mock_access_token,
+            mock_ig_account_id,
+            output_csv="test_output.csv",
+            _open=fake_files.open,
+        )
 
-        # Verify both medias are in output
-        handle = mock_file()
-        written_content = "".join(call.args[0] for call in handle.write.call_args_list)
-        assert "media_1" in written_content
-        assert "media_2" in written_content
+        output = capsys.readouterr().out
+        assert output.count("medias so far") == 1
+        assert "Saved 500 medias so far" in output
+        assert "Successfully saved 600 advertisable medias" in output
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
     def test_fetch_all_advertisable_medias_only_with_permission(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
         sample_media_response,
+        fake_files,
     ):
         """Test that only_with_permission filter excludes medias without permission"""
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = sample_media_response
-        mock_get.return_value = mock_response
+        mock_response.content = json.dumps(sample_media_response).encode()
+        self.mock_get.return_value = mock_response
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
             only_with_permission=True,
+            _open=fake_files.open,
         )
 
-        handle = mock_file()
-        written_content = "".join(call.args[0] for call in handle.write.call_args_list)
+        rows = fake_files.rows("test_output.csv")
         # media_123 has permission, media_456 does not
-        assert "media_123" in written_content
-        assert "media_456" not in written_content
+        assert [row["media_id"] for row in rows] == ["media_123"]
+        assert rows[0]["eligibility_errors"] == "[]"
 
-    @patch("stats_for_dashboards.partnership_ads_booster.fetch_media_insights")
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
+    @patch.object(PAB, "fetch_media_basic_metrics_batch")
     def test_fetch_all_advertisable_medias_with_engagement_metrics(
         self,
-        mock_file,
-        mock_get,
-        mock_fetch_insights,
+        mock_fetch_metrics,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
         sample_media_response,
+        fake_files,
     ):
         """Test that include_engagement_metrics fetches and includes metrics"""
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = sample_media_response
-        mock_get.return_value = mock_response
+        mock_response.content = json.dumps(sample_media_response).encode()
+        self.mock_get.return_value = mock_response
 
-        # Mock fetch_media_insights to return metrics
-        mock_fetch_insights.return_value = {"likes": 100, "comments": 10}
+        # Mock the batched metrics fetch to return metrics for both medias
+        mock_fetch_metrics.return_value = {
+            "media_123": {"likes": 100, "comments": 10},
+            "media_456": {"likes": 5, "comments": 1},
+        }
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
             include_engagement_metrics=True,
+            _open=fake_files.open,
         )
 
-        # Verify fetch_media_insights was called for each media
-        assert mock_fetch_insights.call_count == 2
+        # Verify metrics were fetched once for all medias
+        mock_fetch_metrics.assert_called_once_with(
+            mock_access_token, ["media_123", "media_456"]
+        )
 
-        handle = mock_file()
-        written_content = "".join(call.args[0] for call in handle.write.call_args_list)
+        rows = fake_files.rows("test_output.csv")
         # Verify metrics columns are in output
-        assert "likes" in written_content
-        assert "comments" in written_content
+        assert [(row["likes"], row["comments"]) for row in rows] == [
+            ("100", "10"),
+            ("5", "1"),
+        ]
+
+    @patch.object(PAB, "fetch_media_basic_metrics_batch")
+    def test_fetch_all_advertisable_medias_metrics_per_chunk_in_order(
+        self,
+        mock_fetch_metrics,
+        mock_access_token,
+        mock_ig_account_id,
+        fake_files,
+    ):
+        """Test that metrics are fetched per chunk and rows are written in page order"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps(
+            {
+                "data": [{"id": f"media_{i}"} for i in range(60)]
+            }
+        ).encode()
+        self.mock_get.return_value = mock_response
+        mock_fetch_metrics.side_effect = lambda token, ids: {
+            media_id: {"likes": int(media_id.split("_")[1]), "comments": 0}
+            for media_id in ids
+        }
+
+        fetch_all(
+            mock_access_token,
+            mock_ig_account_id,
+            output_csv="test_output.csv",
+            include_engagement_metrics=True,
+            _open=fake_files.open,
+        )
+
+        assert mock_fetch_metrics.call_count == 2
+        rows = fake_files.rows("test_output.csv")
+        assert [row["media_id"] for row in rows] == [f"media_{i}" for i in range(60)]
+        assert [row["likes"] for row in rows] == [str(i) for i in range(60)]
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
-    @patch("builtins.open", new_callable=mock_open)
     def test_fetch_all_advertisable_medias_without_engagement_metrics(
         self,
-        mock_file,
-        mock_get,
         mock_access_token,
         mock_ig_account_id,
         mock_creator_username,
         sample_media_response,
+        fake_files,
     ):
         """Test that metrics columns are not included when include_engagement_metrics is False"""
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = sample_media_response
-        mock_get.return_value = mock_response
+        mock_response.content = json.dumps(sample_media_response).encode()
+        self.mock_get.return_value = mock_response
 
-        partnership_ads_booster.fetch_all_advertisable_medias(
+        fetch_all(
             mock_access_token,
             mock_ig_account_id,
             mock_creator_username,
             "test_output.csv",
             include_engagement_metrics=False,
+            _open=fake_files.open,
         )
 
-        handle = mock_file()
-        written_content = "".join(call.args[0] for call in handle.write.call_args_list)
+        rows = fake_files.rows("test_output.csv")
         # Verify the header row doesn't include likes/comments columns
-        lines = written_content.split('\n')
-        header = lines[0] if lines else ""
-        assert "likes" not in header.split(',')
-        assert "comments" not in header.split(',')
+        assert "likes" not in rows[0]
+        assert "comments" not in rows[0]
 
 
 class TestFetchBrandedContentAdvertisableMedias:
     """Tests for fetch_branded_content_advertisable_medias function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_with_ad_code_success(
         self, mock_get, mock_access_token, mock_ig_account_id
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "data": [
-                {
-                    "id": "media_123",
-                    "has_permission_for_partnership_ad": True,
-                    "eligibility_errors": [],
-                }
-            ]
-        }
+        mock_response.content = json.dumps(
+            {
+                "data": [
+                    {
+                        "id": "media_123",
+                        "has_permission_for_partnership_ad": True,
+                        "eligibility_errors": [],
+                    }
+                ]
+            }
+        ).encode()
         mock_get.return_value = mock_response
 
         result = partnership_ads_booster.fetch_branded_content_advertisable_medias(
@@ -609,15 +790,16 @@ class TestFetchBrandedContentAdvertisableMedias:
         assert result["id"] == "media_123"
         assert result["has_permission_for_partnership_ad"] == True
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_with_permalinks_success(
         self, mock_get, mock_access_token, mock_ig_account_id
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "data": [{"id": "media_123", "permalink": "https://instagram.com/p/abc123"}]
-        }
+        mock_response.content = json.dumps(
+            {
+                "data": [{"id": "media_123", "permalink": "https://instagram.com/p/abc123"}]
+            }
+        ).encode()
         mock_get.return_value = mock_response
 
         result = partnership_ads_booster.fetch_branded_content_advertisable_medias(
@@ -637,7 +819,6 @@ class TestFetchBrandedContentAdvertisableMedias:
                 mock_access_token, mock_ig_account_id
             )
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.get")
     def test_fetch_api_error(self, mock_get, mock_access_token, mock_ig_account_id):
         mock_response = MagicMock()
         mock_response.status_code = 400
@@ -651,110 +832,213 @@ class TestFetchBrandedContentAdvertisableMedias:
         assert result == {"error": "Bad Request"}
 
 
-class TestUploadInstagramVideo:
-    """Tests for upload_instagram_video function"""
+class TestBatchEligibility:
+    """Tests for batch_eligibility function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
-    def test_upload_video_success(
-        self, mock_post, mock_access_token, mock_ad_account_id
+    def test_batch_eligibility_success(
+        self, mock_post, mock_access_token, mock_ig_account_id
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"id": "video_123"}
+        mock_response.content = json.dumps(
+            [
+                {"code": 200, "body": json.dumps({"data": [{"id": "media_1"}]})},
+                {"code": 200, "body": json.dumps({"data": []})},
+                {"code": 400, "body": "Bad Request"},
+                None,
+            ]
+        ).encode()
         mock_post.return_value = mock_response
 
-        video_id, error = partnership_ads_booster.upload_instagram_video(
-            mock_access_token, mock_ad_account_id, "media_123"
+        result = partnership_ads_booster.batch_eligibility(
+            mock_access_token,
+            mock_ig_account_id,
+            [
+                (1, "ad_code_1", None),
+                (2, None, ["abc123"]),
+                (3, None, ["def456"]),
+                (4, None, ["ghi789"]),
+            ],
         )
 
-        assert video_id == "video_123"
-        assert error is None
+        mock_post.assert_called_once()
+        batch = json.loads(mock_post.call_args[1]["data"]["batch"])
+        assert len(batch) == 4
+        assert "ad_code=ad_code_1" in batch[0]["relative_url"]
+        assert "permalinks=" in batch[1]["relative_url"]
+        assert result == {
+            1: {"id": "media_1"},
+            2: None,
+            3: {"error": "Bad Request"},
+        }
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
-    def test_upload_video_with_ad_code(
-        self, mock_post, mock_access_token, mock_ad_account_id
+    def test_batch_eligibility_request_failure(
+        self, mock_post, mock_access_token, mock_ig_account_id
     ):
         mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"id": "video_123"}
+        mock_response.status_code = 500
+        mock_response.text = "Internal Error"
         mock_post.return_value = mock_response
 
-        video_id, error = partnership_ads_booster.upload_instagram_video(
-            mock_access_token, mock_ad_account_id, "media_123", ad_code="test_ad_code"
+        result = partnership_ads_booster.batch_eligibility(
+            mock_access_token, mock_ig_account_id, [(1, "ad_code_1", None)]
         )
 
-        assert video_id == "video_123"
-        assert error is None
-        call_args = mock_post.call_args
-        assert call_args[1]["params"]["partnership_ad_ad_code"] == "test_ad_code"
-        assert call_args[1]["params"]["is_partnership_ad"] == True
+        # Nothing is returned so callers fall back to single requests
+        assert result == {}
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
-    def test_upload_video_api_error(
-        self, mock_post, mock_access_token, mock_ad_account_id
+    @pytest.mark.parametrize(
+        "content", [b"not json", b'{"error": "unexpected"}'], ids=["malformed", "dict"]
+    )
+    def test_batch_eligibility_unreadable_response(
+        self, mock_post, mock_access_token, mock_ig_account_id, content
     ):
         mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_response.text = "Bad Request"
+        mock_response.status_code = 200
+        mock_response.content = content
         mock_post.return_value = mock_response
 
-        video_id, error = partnership_ads_booster.upload_instagram_video(
-            mock_access_token, mock_ad_account_id, "media_123"
+        result = partnership_ads_booster.batch_eligibility(
+            mock_access_token, mock_ig_account_id, [(1, "ad_code_1", None)]
         )
 
-        assert video_id is None
-        assert "Bad Request" in error
-
-
-class TestCreateAdCreative:
-    """Tests for create_ad_creative function"""
+        assert result == {}
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
-    def test_create_creative_success(
-        self,
-        mock_post,
-        mock_access_token,
-        mock_ad_account_id,
-        mock_facebook_page_id,
-        mock_ig_account_id,
+    def test_batch_eligibility_skips_retryable_sub_responses(
+        self, mock_post, mock_access_token, mock_ig_account_id
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"id": "creative_123"}
+        mock_response.content = json.dumps(
+            [
+                {"code": 429, "body": "Too Many Requests"},
+                {"code": 503, "body": "Service Unavailable"},
+                {"code": 200, "body": "not json"},
+                {"code": 200, "body": json.dumps({"data": [{"id": "media_4"}]})},
+            ]
+        ).encode()
         mock_post.return_value = mock_response
 
-        creative_id, error = partnership_ads_booster.create_ad_creative(
+        result = partnership_ads_booster.batch_eligibility(
             mock_access_token,
-            mock_ad_account_id,
-            mock_facebook_page_id,
             mock_ig_account_id,
-            "media_123",
-            None,
-            "INSTALL_MOBILE_APP",
-            "https://app.link/install",
-            "myapp://landing",
+            [(i, f"ad_code_{i}", None) for i in range(1, 5)],
         )
 
-        assert creative_id == "creative_123"
-        assert error is None
+        # Only the readable answer is kept; the rest fall back to single requests
+        assert result == {4: {"id": "media_4"}}
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
-    def test_create_creative_with_product_set(
-        self,
-        mock_post,
-        mock_access_token,
-        mock_ad_account_id,
-        mock_facebook_page_id,
-        mock_ig_account_id,
+    def test_batch_eligibility_splits_into_chunks(
+        self, mock_post, mock_access_token, mock_ig_account_id
     ):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"id": "creative_123"}
+        mock_response.content = json.dumps([]).encode()
         mock_post.return_value = mock_response
 
-        creative_id, error = partnership_ads_booster.create_ad_creative(
+        partnership_ads_booster.batch_eligibility(
             mock_access_token,
-            mock_ad_account_id,
+            mock_ig_account_id,
+            [(i, f"ad_code_{i}", None) for i in range(120)],
+        )
+
+        assert mock_post.call_count == 3
+
+
+class TestUploadInstagramVideo:
+    """Tests for upload_instagram_video function"""
+
+    def test_upload_video_success(
+        self, mock_post, response_factory, mock_access_token, mock_ad_account_id
+    ):
+        mock_post.return_value = response_factory(200, _VIDEO_OK)
+
+        video_id, error = partnership_ads_booster.upload_instagram_video(
+            mock_access_token, mock_ad_account_id, "media_123"
+        )
+
+        assert video_id == "video_123"
+        assert error is None
+
+    def test_upload_video_with_ad_code(
+        self, mock_post, response_factory, mock_access_token, mock_ad_account_id
+    ):
+        mock_post.return_value = response_factory(200, _VIDEO_OK)
+
+        video_id, error = partnership_ads_booster.upload_instagram_video(
+            mock_access_token, mock_ad_account_id, "media_123", ad_code="test_ad_code"
+        )
+
+        assert video_id == "video_123"
+        assert error is None
+        call_args = mock_post.call_args
+        assert call_args[1]["params"]["partnership_ad_ad_code"] == "test_ad_code"
+        assert call_args[1]["params"]["is_partnership_ad"] == True
+
+    def test_upload_video_api_error(
+        self, mock_post, response_factory, mock_access_token, mock_ad_account_id
+    ):
+        mock_post.return_value = response_factory(400, text="Bad Request")
+
+        video_id, error = partnership_ads_booster.upload_instagram_video(
+            mock_access_token, mock_ad_account_id, "media_123"
+        )
+
+        assert video_id is None
+        assert "Bad Request" in error
+
+
+class TestCreateAdCreative:
+    """Tests for create_ad_creative function"""
+
+    def test_create_creative_success(
+        self,
+        mock_post,
+        response_factory,
+        mock_access_token,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        mock_ig_account_id,
+    ):
+        mock_post.return_value = response_factory(200, _CREATIVE_OK)
+
+        creative_id, error = partnership_ads_booster.create_ad_creative(
+            mock_access_token,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            mock_ig_account_id,
+            "media_123",
+            None,
+            "INSTALL_MOBILE_APP",
+            "https://app.link/install",
+            "myapp://landing",
+        )
+
+        assert creative_id == "creative_123"
+        assert error is None
+        params = mock_post.call_args[1]["params"]
+        assert json.loads(params["call_to_action"]) == {
+            "type": "INSTALL_MOBILE_APP",
+            "value": {"link": "https://app.link/install", "app_link": "myapp://landing"},
+        }
+        assert json.loads(params["facebook_branded_content"]) == {
+            "sponsor_page_id": mock_facebook_page_id
+        }
+
+    def test_create_creative_with_product_set(
+        self,
+        mock_post,
+        response_factory,
+        mock_access_token,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        mock_ig_account_id,
+    ):
+        mock_post.return_value = response_factory(200, _CREATIVE_OK)
+
+        creative_id, error = partnership_ads_booster.create_ad_creative(
+            mock_access_token,
+            mock_ad_account_id,
             mock_facebook_page_id,
             mock_ig_account_id,
             "media_123",
@@ -770,20 +1054,16 @@ class TestCreateAdCreative:
         call_args = mock_post.call_args
         assert "degrees_of_freedom_spec" in call_args[1]["params"]
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
     def test_create_creative_api_error(
         self,
         mock_post,
+        response_factory,
         mock_access_token,
         mock_ad_account_id,
         mock_facebook_page_id,
         mock_ig_account_id,
     ):
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_response.text = "Bad Request"
-        mock_response.json.return_value = {"error": "Bad Request"}
-        mock_post.return_value = mock_response
+        mock_post.return_value = response_factory(400, _BAD_REQUEST, text="Bad Request")
 
         creative_id, error = partnership_ads_booster.create_ad_creative(
             mock_access_token,
@@ -826,12 +1106,10 @@ class TestCreateAdCreative:
 class TestCreateAd:
     """Tests for create_ad function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
-    def test_create_ad_success(self, mock_post, mock_access_token, mock_ad_account_id):
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"id": "ad_123"}
-        mock_post.return_value = mock_response
+    def test_create_ad_success(
+        self, mock_post, response_factory, mock_access_token, mock_ad_account_id
+    ):
+        mock_post.return_value = response_factory(200, _AD_OK)
 
         ad_id, error = partnership_ads_booster.create_ad(
             mock_access_token,
@@ -844,15 +1122,10 @@ class TestCreateAd:
         assert ad_id == "ad_123"
         assert error is None
 
-    @patch("stats_for_dashboards.partnership_ads_booster.requests.post")
     def test_create_ad_api_error(
-        self, mock_post, mock_access_token, mock_ad_account_id
+        self, mock_post, response_factory, mock_access_token, mock_ad_account_id
     ):
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_response.text = "Bad Request"
-        mock_response.json.return_value = {"error": "Bad Request"}
-        mock_post.return_value = mock_response
+        mock_post.return_value = response_factory(400, _BAD_REQUEST, text="Bad Request")
 
         ad_id, error = partnership_ads_booster.create_ad(
             mock_access_token,
@@ -869,30 +1142,26 @@ class TestCreateAd:
 class TestCreatePartnershipAdsFromCsv:
     """Tests for create_partnership_ads_from_csv function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.create_ad")
-    @patch("stats_for_dashboards.partnership_ads_booster.create_ad_creative")
-    @patch("stats_for_dashboards.partnership_ads_booster.upload_instagram_video")
-    @patch(
-        "stats_for_dashboards.partnership_ads_booster.fetch_branded_content_advertisable_medias"
-    )
-    @patch("builtins.open", new_callable=mock_open)
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    @patch.object(PAB, "create_ad")
+    @patch.object(PAB, "create_ad_creative")
+    @patch.object(PAB, "upload_instagram_video")
+    @patch.object(PAB, "fetch_branded_content_advertisable_medias")
     def test_create_partnership_ads_success(
         self,
-        mock_file,
         mock_fetch,
         mock_upload,
         mock_creative,
         mock_ad,
+        mock_batch,
         mock_access_token,
         mock_ig_account_id,
         mock_ad_account_id,
         mock_facebook_page_id,
         sample_csv_rows,
+        fake_files,
     ):
-        csv_content = "media_id,permalink,owner_id,has_permission_for_partnership_ad,eligibility_errors,ad_set_id,cta_type,link,app_link,ad_name,ad_code,product_set_id\n"
-        csv_content += "media_123,https://instagram.com/p/abc123,owner_123,True,[],adset_123,INSTALL_MOBILE_APP,https://app.link/install,myapp://landing,Test Ad 1,,\n"
-
-        mock_file.return_value.__enter__.return_value = StringIO(csv_content)
+        fake_files["input.csv"] = _SAMPLE_CREATE_CSV
 
         # Mock eligibility check
         mock_fetch.return_value = {
@@ -906,53 +1175,258 @@ class TestCreatePartnershipAdsFromCsv:
         mock_creative.return_value = ("creative_123", None)
         mock_ad.return_value = ("ad_123", None)
 
-        partnership_ads_booster.create_partnership_ads_from_csv(
+        status_counts = partnership_ads_booster.create_partnership_ads_from_csv(
             mock_access_token,
             mock_ig_account_id,
             mock_ad_account_id,
             mock_facebook_page_id,
             "input.csv",
             "output.csv",
+            _open=fake_files.open,
         )
 
+        assert status_counts == {"success": 1}
+        mock_batch.assert_called_once()
         mock_fetch.assert_called_once()
         mock_upload.assert_called_once()
         mock_creative.assert_called_once()
         mock_ad.assert_called_once()
 
-    @patch("builtins.open", new_callable=mock_open)
-    def test_create_partnership_ads_missing_fields(
+    @patch.object(PAB, "batch_eligibility")
+    @patch.object(PAB, "create_ad")
+    @patch.object(PAB, "create_ad_creative")
+    @patch.object(PAB, "upload_instagram_video")
+    @patch.object(PAB, "fetch_branded_content_advertisable_medias")
+    def test_create_partnership_ads_uses_batched_eligibility(
         self,
-        mock_file,
+        mock_fetch,
+        mock_upload,
+        mock_creative,
+        mock_ad,
+        mock_batch,
         mock_access_token,
         mock_ig_account_id,
         mock_ad_account_id,
         mock_facebook_page_id,
+        fake_files,
     ):
-        csv_content = "media_id,permalink,ad_set_id,cta_type,ad_name\n"
-        csv_content += "media_123,https://instagram.com/p/abc123,,,Test Ad 1\n"
+        mock_batch.return_value = {
+            (None, "abc123"): {
+                "id": "media_123",
+                "has_permission_for_partnership_ad": True,
+                "eligibility_errors": [],
+            }
+        }
+        mock_upload.return_value = ("video_123", None)
+        mock_creative.return_value = ("creative_123", None)
+        mock_ad.return_value = ("ad_123", None)
+
+        partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            csv.DictReader(StringIO(_SAME_MEDIA_TWICE_CSV)),
+            "output.csv",
+            _open=fake_files.open,
+        )
+
+        # The repeated media is looked up and uploaded only once
+        mock_batch.assert_called_once_with(
+            mock_access_token,
+            mock_ig_account_id,
+            [((None, "abc123"), None, ["abc123"])],
+        )
+        mock_fetch.assert_not_called()
+        mock_upload.assert_called_once()
+        assert mock_ad.call_count == 2
 
-        mock_file.return_value.__enter__.return_value = StringIO(csv_content)
+    @patch.object(PAB, "batch_eligibility")
+    @patch.object(PAB, "create_ad")
+    @patch.object(PAB, "create_ad_creative")
+    @patch.object(PAB, "upload_instagram_video")
+    def test_create_partnership_ads_retries_failed_upload(
+        self,
+        mock_upload,
+        mock_creative,
+        mock_ad,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        fake_files,
+    ):
+        mock_batch.return_value = {
+            (None, "abc123"): {
+                "id": "media_123",
+                "has_permission_for_partnership_ad": True,
+                "eligibility_errors": [],
+            }
+        }
+        # The first upload of the shared media fails, the retry succeeds
+        mock_upload.side_effect = [
+            (None, "Video upload failed: 500"),
+            ("video_123", None),
+        ]
+        mock_creative.return_value = ("creative_123", None)
+        mock_ad.return_value = ("ad_123", None)
+
+        status_counts = partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            csv.DictReader(StringIO(_SAME_MEDIA_TWICE_CSV)),
+            "output.csv",
+            max_workers=1,
+            _open=fake_files.open,
+        )
+
+        assert status_counts == {"failed": 1, "success": 1}
+        assert mock_upload.call_count == 2
+        rows = fake_files.rows("output.csv")
+        assert [row["video_id"] for row in rows] == ["", "video_123"]
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    @patch.object(PAB, "create_ad")
+    @patch.object(PAB, "create_ad_creative")
+    @patch.object(PAB, "upload_instagram_video")
+    @patch.object(PAB, "fetch_branded_content_advertisable_medias")
+    def test_create_partnership_ads_interrupted(
+        self,
+        mock_fetch,
+        mock_upload,
+        mock_creative,
+        mock_ad,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        fake_files,
+    ):
+        """Test that an interrupted run records every row that created an ad"""
+        mock_fetch.return_value = {
+            "id": "media_123",
+            "has_permission_for_partnership_ad": True,
+            "eligibility_errors": [],
+        }
+        mock_upload.return_value = ("video_123", None)
+        mock_creative.return_value = ("creative_123", None)
+        mock_ad.return_value = ("ad_123", None)
+        # Ctrl-C arrives right after the first row is written
+        progress = MagicMock(side_effect=[KeyboardInterrupt] + [None] * 9)
+
+        with pytest.raises(KeyboardInterrupt):
+            partnership_ads_booster.create_partnership_ads_from_csv(
+                mock_access_token,
+                mock_ig_account_id,
+                mock_ad_account_id,
+                mock_facebook_page_id,
+                csv.DictReader(StringIO(_TEN_ROWS_CSV)),
+                "output.csv",
+                max_workers=1,
+                progress=progress,
+                _open=fake_files.open,
+            )
+
+        # With one worker, the second row was already submitted; the rest never start
+        rows = fake_files.rows("output.csv")
+        assert [(row["ad_name"], row["status"]) for row in rows] == [
+            ("Ad 0", "success"),
+            ("Ad 1", "success"),
+        ]
+        assert mock_ad.call_count == 2
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    @patch.object(PAB, "create_ad")
+    @patch.object(PAB, "create_ad_creative")
+    @patch.object(PAB, "upload_instagram_video")
+    @patch.object(PAB, "fetch_branded_content_advertisable_medias")
+    def test_create_partnership_ads_multiple_rows_keep_input_order(
+        self,
+        mock_fetch,
+        mock_upload,
+        mock_creative,
+        mock_ad,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        fake_files,
+    ):
+        mock_fetch.return_value = {
+            "id": "media_123",
+            "has_permission_for_partnership_ad": True,
+            "eligibility_errors": [],
+        }
+        mock_upload.return_value = ("video_123", None)
+        mock_creative.return_value = ("creative_123", None)
+        mock_ad.side_effect = lambda token, account, ad_name, *args: (
+            f"ad_for_{ad_name}",
+            None,
+        )
 
         partnership_ads_booster.create_partnership_ads_from_csv(
             mock_access_token,
             mock_ig_account_id,
             mock_ad_account_id,
             mock_facebook_page_id,
-            "input.csv",
+            csv.DictReader(StringIO(_TEN_ROWS_CSV)),
+            "output.csv",
+            max_workers=2,
+            _open=fake_files.open,
+        )
+
+        # More rows than the pending window, so rows are read and written in waves
+        assert mock_ad.call_count == 10
+        output_rows = fake_files.rows("output.csv")
+        assert [r["ad_name"] for r in output_rows] == [f"Ad {i}" for i in range(10)]
+        assert [r["published_ad_id"] for r in output_rows] == [
+            f"ad_for_Ad {i}" for i in range(10)
+        ]
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    @patch.object(PAB, "create_ad")
+    def test_create_partnership_ads_missing_fields(
+        self,
+        mock_ad,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        fake_files,
+    ):
+        status_counts = partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            csv.DictReader(StringIO(_MISSING_FIELDS_CSV)),
             "output.csv",
+            _open=fake_files.open,
         )
 
-    @patch("builtins.open", side_effect=FileNotFoundError)
+        assert status_counts == {"failed": 1}
+        [row] = fake_files.rows("output.csv")
+        assert row["ad_name"] == "Test Ad 1"
+        assert row["status"] == "failed"
+        assert row["error"] == "Missing required fields: cta_type, link, ad_set_id"
+        mock_ad.assert_not_called()
+
     def test_create_partnership_ads_file_not_found(
         self,
-        mock_file,
         mock_access_token,
         mock_ig_account_id,
         mock_ad_account_id,
         mock_facebook_page_id,
+        fake_files,
     ):
-        with pytest.raises(SystemExit) as exc_info:
+        # fake_files has no nonexistent.csv, so its open raises FileNotFoundError
+        with pytest.raises(partnership_ads_booster.FetchError, match="nonexistent.csv"):
             partnership_ads_booster.create_partnership_ads_from_csv(
                 mock_access_token,
                 mock_ig_account_id,
@@ -960,158 +1434,448 @@ class TestCreatePartnershipAdsFromCsv:
                 mock_facebook_page_id,
                 "nonexistent.csv",
                 "output.csv",
+                _open=fake_files.open,
             )
-        assert exc_info.value.code == 1
+        assert not fake_files
 
-    @patch("builtins.open", new_callable=mock_open)
-    def test_create_partnership_ads_with_stories_url(
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    def test_create_partnership_ads_from_rows_to_stream(
         self,
-        mock_file,
+        mock_batch,
         mock_access_token,
         mock_ig_account_id,
         mock_ad_account_id,
         mock_facebook_page_id,
     ):
-        csv_content = "permalink,cta_type,link,app_link,ad_name,ad_set_id,ad_code,product_set_id\n"
-        csv_content += "https://www.instagram.com/stories/username/123456/,INSTALL_MOBILE_APP,https://app.link,myapp://landing,Test Ad,adset_123,,,\n"
+        """Test that parsed rows and an in-memory output can replace file paths"""
+        rows = [{"permalink": "", "ad_name": "Ad 1"}]
+        buf = BytesIO()
+
+        progress = MagicMock()
+
+        status_counts = partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            rows,
+            buf,
+            progress=progress,
+        )
+
+        assert status_counts == {"failed": 1}
+        progress.assert_called_once_with(1)
+        output_rows = list(csv.DictReader(StringIO(buf.getvalue().decode("utf-8"))))
+        assert output_rows[0]["ad_name"] == "Ad 1"
+        assert output_rows[0]["status"] == "failed"
 
-        mock_file.return_value.__enter__.return_value = StringIO(csv_content)
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    def test_create_partnership_ads_parquet_output(
+        self,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+    ):
+        """Test that results can be written as Parquet instead of CSV"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        rows = [{"permalink": "", "ad_name": "Ad 1"}]
+        buf = BytesIO()
 
         partnership_ads_booster.create_partnership_ads_from_csv(
             mock_access_token,
             mock_ig_account_id,
             mock_ad_account_id,
             mock_facebook_page_id,
-            "input.csv",
+            rows,
+            buf,
+            output_format="parquet",
+        )
+
+        buf.seek(0)
+        output_rows = pq.read_table(buf).to_pylist()
+        assert output_rows[0]["ad_name"] == "Ad 1"
+        assert output_rows[0]["status"] == "failed"
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    def test_create_partnership_ads_resume(
+        self,
+        mock_batch,
+        tmp_path,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+    ):
+        """Test that a resumed run appends and skips rows that already created an ad"""
+        output_csv = tmp_path / "output.csv"
+        output_csv.write_text(
+            "ad_name,ad_set_id,status,error,video_id,creative_id,published_ad_id\n"
+            "Ad 1,adset_1,success,,video_1,creative_1,ad_1\n",
+            encoding="utf-8",
+        )
+        rows = [
+            {"ad_name": "Ad 1", "ad_set_id": "adset_1"},
+            {"ad_name": "Ad 2", "ad_set_id": "adset_2"},
+        ]
+
+        status_counts = partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            rows,
+            str(output_csv),
+            resume=True,
+        )
+
+        # Only Ad 2 was processed; it fails validation without any API call
+        assert status_counts == {"failed": 1}
+        with open(output_csv, newline="", encoding="utf-8") as f:
+            output_rows = list(csv.DictReader(f))
+        assert [(row["ad_name"], row["status"]) for row in output_rows] == [
+            ("Ad 1", "success"),
+            ("Ad 2", "failed"),
+        ]
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    def test_create_partnership_ads_resume_killed_between_syncs(
+        self,
+        mock_batch,
+        tmp_path,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+    ):
+        """Test that every finished row is on disk before the next fsync"""
+        output_csv = tmp_path / "output.csv"
+        rows = [{"ad_name": f"Ad {i}", "ad_set_id": f"adset_{i}"} for i in range(5)]
+        on_disk = []
+
+        def kill_after_three(processed):
+            # What a killed process leaves behind is what the OS already has
+            if processed == 3:
+                with open(output_csv, newline="", encoding="utf-8") as f:
+                    on_disk.extend(csv.DictReader(f))
+                raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            partnership_ads_booster.create_partnership_ads_from_csv(
+                mock_access_token,
+                mock_ig_account_id,
+                mock_ad_account_id,
+                mock_facebook_page_id,
+                rows,
+                str(output_csv),
+                max_workers=1,
+                resume=True,
+                progress=kill_after_three,
+            )
+
+        assert partnership_ads_booster.RESUME_FSYNC_EVERY > 3
+        assert [row["ad_name"] for row in on_disk] == ["Ad 0", "Ad 1", "Ad 2"]
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    def test_create_partnership_ads_resume_after_torn_line(
+        self,
+        mock_batch,
+        tmp_path,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+    ):
+        """Test that rows appended after a torn last line start on a new line"""
+        output_csv = tmp_path / "output.csv"
+        output_csv.write_text(
+            "ad_name,ad_set_id,status,error,video_id,creative_id,published_ad_id\n"
+            "Ad 1,adset_1,success,,video_1,creative_1,ad_1\n"
+            "Ad 2,adset_2,fai",
+            encoding="utf-8",
+        )
+
+        partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            [{"ad_name": "Ad 3", "ad_set_id": "adset_3"}],
+            str(output_csv),
+            resume=True,
+        )
+
+        with open(output_csv, newline="", encoding="utf-8") as f:
+            output_rows = list(csv.DictReader(f))
+        assert [(row["ad_name"], row["status"]) for row in output_rows] == [
+            ("Ad 1", "success"),
+            ("Ad 2", "fai"),
+            ("Ad 3", "failed"),
+        ]
+
+    @patch.object(PAB, "batch_eligibility")
+    @patch.object(PAB, "create_ad")
+    @patch.object(PAB, "create_ad_creative")
+    @patch.object(PAB, "upload_instagram_video")
+    @patch.object(PAB, "fetch_branded_content_advertisable_medias")
+    def test_create_partnership_ads_resume_header_mismatch(
+        self,
+        mock_fetch,
+        mock_upload,
+        mock_creative,
+        mock_ad,
+        mock_batch,
+        tmp_path,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+    ):
+        """Test that resuming into a file with other columns fails before creating ads"""
+        previous_output = (
+            "ad_name,ad_set_id,status,error,video_id,creative_id,published_ad_id\n"
+            "Ad 1,adset_1,success,,video_1,creative_1,ad_1\n"
+        )
+        output_csv = tmp_path / "output.csv"
+        output_csv.write_text(previous_output, encoding="utf-8")
+
+        with pytest.raises(partnership_ads_booster.FetchError, match="Cannot resume"):
+            partnership_ads_booster.create_partnership_ads_from_csv(
+                mock_access_token,
+                mock_ig_account_id,
+                mock_ad_account_id,
+                mock_facebook_page_id,
+                csv.DictReader(StringIO(_SAMPLE_CREATE_CSV)),
+                str(output_csv),
+                resume=True,
+            )
+
+        mock_batch.assert_not_called()
+        mock_fetch.assert_not_called()
+        mock_upload.assert_not_called()
+        mock_creative.assert_not_called()
+        mock_ad.assert_not_called()
+        assert output_csv.read_text(encoding="utf-8") == previous_output
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    def test_create_partnership_ads_caps_max_workers(
+        self,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        fake_files,
+    ):
+        """Test that no more workers run than the session has pooled connections"""
+        with patch.object(
+            PAB, "ThreadPoolExecutor", wraps=PAB.ThreadPoolExecutor
+        ) as mock_pool:
+            partnership_ads_booster.create_partnership_ads_from_csv(
+                mock_access_token,
+                mock_ig_account_id,
+                mock_ad_account_id,
+                mock_facebook_page_id,
+                [{"ad_name": "Ad 1", "ad_set_id": "adset_1"}],
+                "output.csv",
+                max_workers=100,
+                _open=fake_files.open,
+            )
+
+        assert mock_pool.call_args[1]["max_workers"] == PAB.HTTP_POOL_SIZE
+
+    @patch.object(PAB, "batch_eligibility", return_value={})
+    @patch.object(PAB, "create_ad")
+    def test_create_partnership_ads_with_stories_url(
+        self,
+        mock_ad,
+        mock_batch,
+        mock_access_token,
+        mock_ig_account_id,
+        mock_ad_account_id,
+        mock_facebook_page_id,
+        fake_files,
+    ):
+        status_counts = partnership_ads_booster.create_partnership_ads_from_csv(
+            mock_access_token,
+            mock_ig_account_id,
+            mock_ad_account_id,
+            mock_facebook_page_id,
+            csv.DictReader(StringIO(_STORIES_CSV)),
             "output.csv",
+            _open=fake_files.open,
+        )
+
+        # Stories URLs are rejected during validation, before any API call
+        assert status_counts == {"failed": 1}
+        [row] = fake_files.rows("output.csv")
+        assert row["ad_name"] == "Test Ad"
+        assert row["status"] == "failed"
+        assert row["error"] == "Stories boosting is not supported by this script"
+        mock_ad.assert_not_called()
+
+
+class TestMemoize:
+    """Tests for the _memoize per-run cache"""
+
+    def test_caches_successes(self):
+        cache = {}
+        fn = MagicMock(return_value="video_123")
+        assert partnership_ads_booster._memoize(cache, "key", fn) == "video_123"
+        assert partnership_ads_booster._memoize(cache, "key", fn) == "video_123"
+        fn.assert_called_once()
+
+    def test_forgets_exceptions(self):
+        cache = {}
+        fn = MagicMock(side_effect=[RuntimeError("boom"), "video_123"])
+        with pytest.raises(RuntimeError):
+            partnership_ads_booster._memoize(cache, "key", fn)
+        assert "key" not in cache
+        assert partnership_ads_booster._memoize(cache, "key", fn) == "video_123"
+
+    def test_forgets_results_keep_rejects(self):
+        cache = {}
+        fn = MagicMock(side_effect=[(None, "error"), ("video_123", None)])
+        keep = lambda result: result[0] is not None
+        assert partnership_ads_booster._memoize(cache, "key", fn, keep) == (
+            None,
+            "error",
+        )
+        assert partnership_ads_booster._memoize(cache, "key", fn, keep) == (
+            "video_123",
+            None,
+        )
+        assert fn.call_count == 2
+
+
+class TestValidateRow:
+    """Tests for _validate_row function"""
+
+    def test_valid_row(self, sample_csv_rows):
+        assert partnership_ads_booster._validate_row(sample_csv_rows[0]) is None
+
+    def test_missing_required_fields(self, sample_csv_rows):
+        row = {**sample_csv_rows[0], "link": "", "ad_set_id": ""}
+        assert (
+            partnership_ads_booster._validate_row(row)
+            == "Missing required fields: link, ad_set_id"
         )
 
+    def test_missing_permalink_and_ad_code(self, sample_csv_rows):
+        row = {**sample_csv_rows[0], "permalink": "", "ad_code": ""}
+        assert (
+            partnership_ads_booster._validate_row(row)
+            == "Either permalink or ad_code must be provided"
+        )
+
+    def test_stories_url(self, sample_csv_rows):
+        row = {
+            **sample_csv_rows[0],
+            "permalink": "https://www.instagram.com/stories/username/123456/",
+        }
+        assert "Stories boosting is not supported" in partnership_ads_booster._validate_row(row)
+        # Invalid rows are never sent for an eligibility lookup
+        assert partnership_ads_booster._eligibility_lookup(row) is None
+
 
 class TestMain:
     """Tests for main function"""
 
-    @patch("stats_for_dashboards.partnership_ads_booster.fetch_all_advertisable_medias")
-    @patch(
-        "sys.argv",
+    @pytest.mark.parametrize(
+        "argv, target, expected_kwargs, expected_exit",
         [
-            "partnership_ads_booster.py",
-            "--mode",
-            "fetch",
-            "--access-token",
-            "test_token",
-            "--ig-account-id",
-            "123456",
-            "--creator-username",
-            "test_creator",
+            (
+                _ARGV_FETCH + ("--creator-username", "test_creator"),
+                "fetch_all_advertisable_medias",
+                {"only_with_permission": False, "include_engagement_metrics": False},
+                None,
+            ),
+            (
+                _ARGV_FETCH + ("--only-with-permission",),
+                "fetch_all_advertisable_medias",
+                {"only_with_permission": True, "include_engagement_metrics": False},
+                None,
+            ),
+            (
+                _ARGV_FETCH + ("--include-metrics",),
+                "fetch_all_advertisable_medias",
+                {"only_with_permission": False, "include_engagement_metrics": True},
+                None,
+            ),
+            (
+                _ARGV_FETCH + ("--only-with-permission", "--include-metrics"),
+                "fetch_all_advertisable_medias",
+                {"only_with_permission": True, "include_engagement_metrics": True},
+                None,
+            ),
+            (
+                _ARGV_CREATE_FULL,
+                "create_partnership_ads_from_csv",
+                {"max_workers": partnership_ads_booster.CREATE_MAX_WORKERS},
+                None,
+            ),
+            (
+                _ARGV_CREATE_FULL + ("--max-workers", "4"),
+                "create_partnership_ads_from_csv",
+                {"max_workers": 4},
+                None,
+            ),
+            (
+                _ARGV_CREATE_FULL + ("--max-workers", "0"),
+                "create_partnership_ads_from_csv",
+                None,
+                2,
+            ),
+            (
+                _ARGV_CREATE_FULL
+                + ("--max-workers", str(partnership_ads_booster.HTTP_POOL_SIZE + 1)),
+                "create_partnership_ads_from_csv",
+                None,
+                2,
+            ),
+            (_ARGV_CREATE, "create_partnership_ads_from_csv", None, 1),
         ],
-    )
-    def test_main_fetch_mode(self, mock_fetch):
-        partnership_ads_booster.main()
-        mock_fetch.assert_called_once()
-
-    @patch(
-        "stats_for_dashboards.partnership_ads_booster.create_partnership_ads_from_csv"
-    )
-    @patch(
-        "sys.argv",
-        [
-            "partnership_ads_booster.py",
-            "--mode",
+        ids=[
+            "fetch",
+            "fetch-only-with-permission",
+            "fetch-include-metrics",
+            "fetch-both-flags",
             "create",
-            "--access-token",
-            "test_token",
-            "--ig-account-id",
-            "123456",
-            "--ad-account-id",
-            "789",
-            "--facebook-page-id",
-            "999",
-            "--input-csv",
-            "input.csv",
+            "create-max-workers",
+            "create-max-workers-zero",
+            "create-max-workers-above-pool",
+            "create-missing-args",
         ],
     )
-    def test_main_create_mode(self, mock_create):
+    def test_main_dispatch(
+        self, monkeypatch, argv, target, expected_kwargs, expected_exit
+    ):
+        mock_target = MagicMock()
+        monkeypatch.setattr(PAB, target, mock_target)
+        monkeypatch.setattr(sys, "argv", list(argv))
+
+        if expected_exit is not None:
+            with pytest.raises(SystemExit) as exc_info:
+                partnership_ads_booster.main()
+            assert exc_info.value.code == expected_exit
+            mock_target.assert_not_called()
+            return
+
         partnership_ads_booster.main()
-        mock_create.assert_called_once()
+        mock_target.assert_called_once()
+        call_kwargs = mock_target.call_args[1]
+        for name, value in expected_kwargs.items():
+            assert call_kwargs[name] == value
+
+    def test_main_fetch_error_exits(self, monkeypatch):
+        monkeypatch.setattr(
+            PAB,
+            "fetch_all_advertisable_medias",
+            MagicMock(side_effect=partnership_ads_booster.FetchError("Bad Request")),
+        )
+        monkeypatch.setattr(sys, "argv", list(_ARGV_FETCH))
 
-    @patch(
-        "sys.argv",
-        [
-            "partnership_ads_booster.py",
-            "--mode",
-            "create",
-            "--access-token",
-            "test_token",
-            "--ig-account-id",
-            "123456",
-        ],
-    )
-    def test_main_create_mode_missing_args(self):
         with pytest.raises(SystemExit) as exc_info:
             partnership_ads_booster.main()
         assert exc_info.value.code == 1
-
-    @patch("stats_for_dashboards.partnership_ads_booster.fetch_all_advertisable_medias")
-    @patch(
-        "sys.argv",
-        [
-            "partnership_ads_booster.py",
-            "--mode",
-            "fetch",
-            "--access-token",
-            "test_token",
-            "--ig-account-id",
-            "123456",
-            "--only-with-permission",
-        ],
-    )
-    def test_main_fetch_mode_with_only_permission_flag(self, mock_fetch):
-        """Test that --only-with-permission flag is passed correctly"""
-        partnership_ads_booster.main()
-        mock_fetch.assert_called_once()
-        call_kwargs = mock_fetch.call_args[1]
-        assert call_kwargs["only_with_permission"] == True
-
-    @patch("stats_for_dashboards.partnership_ads_booster.fetch_all_advertisable_medias")
-    @patch(
-        "sys.argv",
-        [
-            "partnership_ads_booster.py",
-            "--mode",
-            "fetch",
-            "--access-token",
-            "test_token",
-            "--ig-account-id",
-            "123456",
-            "--include-metrics",
-        ],
-    )
-    def test_main_fetch_mode_with_include_metrics_flag(self, mock_fetch):
-        """Test that --include-metrics flag is passed correctly"""
-        partnership_ads_booster.main()
-        mock_fetch.assert_called_once()
-        call_kwargs = mock_fetch.call_args[1]
-        assert call_kwargs["include_engagement_metrics"] == True
-
-    @patch("stats_for_dashboards.partnership_ads_booster.fetch_all_advertisable_medias")
-    @patch(
-        "sys.argv",
-        [
-            "partnership_ads_booster.py",
-            "--mode",
-            "fetch",
-            "--access-token",
-            "test_token",
-            "--ig-account-id",
-            "123456",
-            "--only-with-permission",
-            "--include-metrics",
-        ],
-    )
-    def test_main_fetch_mode_with_both_flags(self, mock_fetch):
-        """Test that both flags can be used together"""
-        partnership_ads_booster.main()
-        mock_fetch.assert_called_once()
-        call_kwargs = mock_fetch.call_args[1]
-        assert call_kwargs["only_with_permission"] == True
-        assert call_kwargs["include_engagement_metrics"] == True